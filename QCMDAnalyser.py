@@ -11,342 +11,61 @@
 # may be distributed without limitation.
 
 #from __future__ import unicode_literals
+import csv
 import sys
 import os
-import random
-import matplotlib
-# Make sure that we are using QT5
-matplotlib.use('Qt5Agg')
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5 import QtCore, QtWidgets, QtGui
 
-
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
 import numpy as np
-from scipy import stats
-import csv
-import unittest
-import random
-import string
 
+from QCMDBaseline import BASELINE_MODES, BaselineCorrection
+from QCMDBootstrap import BootstrapIntervals
+from QCMDBuffer import GrowableArray
+from QCMDDataCache import QCMDDataCache
+from QCMDDataset import QUANTITIES, QCMDDataset, data_line
+from QCMDDerived import CHANNEL_LABELS, DERIVED_CHANNELS, TAB_CHANNELS
+from QCMDExcelReader import QCMDDataReader as QCMDSensorReader
+from QCMDExcelReader import is_sensor_export
+from QCMDExport import export_results
+from QCMDProfiler import profiler, timed
+from QCMDRobust import FIT_ENGINES
+from QCMDFitting import (RESULT_DTYPE, RESULT_HEADERS, FitResultCache, empty_results, fit_checked,
+                         fit_lines, format_records, format_value, result_records)
 
 progname = os.path.basename(sys.argv[0])
 progversion = "0.1"
 
 
-class MyMplCanvas(FigureCanvas):
-    """Ultimately, this is a QWidget (as well as a FigureCanvasAgg, etc.)."""
-
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        self.press = None
-        self.prevX = 0
-        self.ydata = list()
-        self.xdata = list()
-        fig = Figure(figsize=(width, height), dpi=dpi)
-
-        self.axes = fig.add_subplot(111)
-
-        self.axes.hold(True)
-
-        #self.compute_initial_figure()
-
-        #
-        FigureCanvas.__init__(self, fig)
-        self.setParent(parent)
-
-        FigureCanvas.setSizePolicy(self,
-                                   QtWidgets.QSizePolicy.Expanding,
-                                   QtWidgets.QSizePolicy.Expanding)
-        FigureCanvas.updateGeometry(self)
-        FigureCanvas.mpl_connect(self,'button_press_event', self.onclick)
-        FigureCanvas.mpl_connect(self, 'button_release_event', self.onrelease)
-        FigureCanvas.mpl_connect(self, 'motion_notify_event', self.onmove)
-        FigureCanvas.mpl_connect(self, 'scroll_event', self.zoom)
-        FigureCanvas.mpl_connect(self, 'pick_event', self.onpick)
-        FigureCanvas.mpl_connect(self, 'figure_enter_event', self.on_enter)
-        FigureCanvas.mpl_connect(self, 'figure_exit_event', self.on_exit)
-
-    def compute_initial_figure(self):
-        pass
-
-    def onclick(self,event):
-        pass
-
-    def onpick(self,event):
-        pass
-
-    def onmove(self,event):
-        pass
-
-    def onrelease(self, event):
-        pass
-
-    def scroll(self,event):
-        pass
-
-    def on_enter(self,event):
-        pass
+class WorkerSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(object)
+    error = QtCore.pyqtSignal(object)
 
-    def on_exit(self,event):
-        pass
 
+class Worker(QtCore.QRunnable):
+    """Runs fn(*args) on the thread pool and reports back through Qt signals.
 
-class QCMDDataPlotter(MyMplCanvas):
-    """Simple canvas with a sine plot."""
-    def __init__(self,  *args, **kwargs):
-        MyMplCanvas.__init__(self, *args, **kwargs)
-
-        self.data_line_list = list()
-        self.data_line_num = 0
-        self.text_list= list()
-
-        self.harmonics = []
-        self.overline = False
-        self.active = True
-
-    def compute_initial_figure(self,x,harmonics, check_values):
-        self.harmonics = harmonics
-        self.time = x
-        self.check_values = check_values
-
-        for plot_harmonic, harmonic in zip(check_values,harmonics):
-            if plot_harmonic:
-                self.plt = self.axes.plot(x, harmonic)
-        self.plt[0].set_picker(1)
-        self.x_array = np.asarray(x)
-
-        self.default_xlim = self.axes.get_xlim()
-        self.default_ylim = self.axes.get_ylim()
-        self.prev_xlim = self.default_xlim
-
-
-        self.f_array = np.asarray(self.harmonics[0][:])
-        self.points_t = np.column_stack((self.x_array))
-        self.points_s = np.column_stack((self.f_array))
-        self.draw()
-
-
-
-    #Used to update the displayed harmonics when graph has been created
-    def redraw_harmonics(self, check_values):
-        self.axes.cla()
-        self.check_values = check_values
-        for plot_harmonic, harmonic in zip(check_values, self.harmonics):
-            if plot_harmonic:
-                self.plt = self.axes.plot(self.time, harmonic)
-        line_nums = range(1, len(self.data_line_list) + 1, 1)
-        for line, line_num in zip(self.data_line_list, line_nums):
-            line.id = line_num
-            self.axes.plot(line.xdata, line.ydata, 'r', linewidth=6.0, alpha=0.7, gid = line.id)
-            self.axes.text(line.xdata[0], line.ydata[0], str(line.id))
-        self.draw()
-
-    def clear_figure(self):
-        self.axes.cla()
-        self.data_line_list= list()
-
-        self.data_line_num = 0
-        self.text_list = list()
-
-
-    def onclick(self, event):
-        if self.active:
-            self.del_line = False
-            if event.dblclick:
-                self.del_line = True
-            if not self.del_line:
-                QtCore.QTimer.singleShot(500, lambda: self.check_double_click(event))
-
-    def zoom(self,event):
-        # get the current x and y limits
-        base_scale = 1.01
-        cur_xlim = self.axes.get_xlim()
-        cur_ylim = self.axes.get_ylim()
-
-        if event.button == 'up':
-            # deal with zoom in
-            self.axes.set_xlim([cur_xlim[0] + base_scale,
-                                cur_xlim[1] - base_scale])
-            self.axes.set_ylim([cur_ylim[0] + base_scale,
-                                cur_ylim[1] - base_scale])
-        elif event.button == 'down':
-            # deal with zoom out
-            self.axes.set_xlim([cur_xlim[0] - base_scale,
-                                cur_xlim[1] + base_scale])
-            self.axes.set_ylim([cur_ylim[0] - base_scale,
-                                cur_ylim[1] + base_scale])
-        else:
-            # deal with something that should never happen
-            scale_factor = 1
+    A cancelled worker still finishes its call, its result is just dropped.
+    """
+    def __init__(self, fn, *args):
+        super(Worker, self).__init__()
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+        self.signals = WorkerSignals()
 
-            event.button
-        # set new limits
-
-        self.draw()  # force re-draw
-
-    def reset_zoom(self):
-        self.axes.set_xlim([self.default_xlim[0],self.default_xlim[1]])
-
-        self.axes.set_ylim([self.default_ylim[0],self.default_ylim[1]])
-        self.draw()
-
-
-    def check_double_click(self, event):
-        if self.del_line:
-            self.delete_line(event)
-        else:
-            if self.overline:
-                self.press = True
-                self.initialx = event.xdata
-                self.prevX = 0
-                self.data_line_num += 1
-            else:
-                self.press = False
-                self.cur_xlim = self.axes.get_xlim()
-                self.cur_ylim = self.axes.get_ylim()
-                self.xpress = event.xdata
-                self.ypress = event.ydata
-                self.setCursor(QtGui.QCursor(QtCore.Qt.ClosedHandCursor))
-
-    def delete_line(self,event):
-        num_harmonics = [x for x in self.check_values if x is not False]
-
-        selected_lines = self.axes.get_lines()[len(num_harmonics):]
-
-        for index, curve in enumerate(selected_lines):
-
-            if curve.contains(event)[0]:
-                print(curve.get_gid())
-
-                [self.data_line_list.pop(line_num.id -1) for line_num in self.data_line_list if line_num.id == curve.get_gid()]
-                self.data_line_num -= 1
-
-                self.redraw_harmonics(self.check_values)
-
-        self.draw()
-
-    def onmove(self, event):
+    def run(self):
         try:
-            if self.press is not None:
-                if self.press:
-                    if event.x > self.prevX:
-
-
-                        idx = np.argmin((self.points_t - (event.xdata)) ** 2)
-
-                        self.xdata.append(self.points_t[0][idx])
-                        self.ydata.append(self.points_s[0][idx])
-                        self.update_graph(event)
-                    elif self.initialx < event.x < self.prevX:
-                        try:
-                            self.xdata.pop()
-                            self.ydata.pop()
-                        except IndexError:
-                            return
-                        self.update_graph(event)
-                else:
-
-                    dx = event.xdata - self.xpress
-                    dy = event.ydata - self.ypress
-                    self.cur_xlim -= dx
-                    self.cur_ylim -= dy
-                    if self.cur_xlim[1] > self.default_xlim[1] or self.cur_xlim[0] < self.default_xlim[0] or \
-                                    self.cur_ylim[1]> (self.default_ylim[1] +10) or self.cur_ylim[0]< (self.default_ylim[0] - 10):
-                        pass
-                    else:
-                        self.axes.set_xlim(self.cur_xlim)
-                        self.axes.set_ylim(self.cur_ylim)
-                        self.prev_xlim = self.cur_xlim
-                    self.draw()
-
-            else:
-                for curve in self.axes.get_lines():
-                    if curve.contains(event)[0]:
-                        self.setCursor(QtGui.QCursor(QtCore.Qt.IBeamCursor))
-                        self.overline = True
-                        break
-                    else:
-                        self.setCursor(QtGui.QCursor(QtCore.Qt.ArrowCursor))
-                        self.overline =False
-
-        except TypeError:
-            pass
-
-    def onrelease(self, event):
-        if self.press:
-
-            if len(self.xdata) > 0:
-                self.axes.text(self.xdata[0], self.ydata[0], str(self.data_line_num))
-
-                self.data_line_list.append(data_line(self.xdata[:], self.ydata[:], self.data_line_num))
-            else:
-                self.data_line_num -= 1
-            del self.xdata[:]
-            del self.ydata[:]
-            self.draw()
-        self.press = None
-
-    def update_graph(self, event):
-        self.redraw_harmonics(self.check_values)
-        self.axes.plot(self.xdata, self.ydata, 'r' , linewidth = 6.0, alpha=0.7, gid = self.data_line_num)
-
-
-        self.draw()
-        self.prevX = event.x
-
-    def get_selected_data(self):
-        for data in self.data_line_list:
-            idx_start = np.argmin((self.points_t - (data.xdata[0])) ** 2)
-            idx_end = np.argmin((self.points_t - (data.xdata[-1])) ** 2)
-            fulldata_x = self.x_array[idx_start:idx_end]
-            f3 = self.f_array[idx_start:idx_end]
-            #Get values for harmonics
-            f5 = np.asarray(self.harmonics[1][idx_start:idx_end])
-            f7 = np.asarray(self.harmonics[2][idx_start:idx_end])
-            f9 = np.asarray(self.harmonics[3][idx_start:idx_end])
-            f11 = np.asarray(self.harmonics[4][idx_start:idx_end])
-            f13 = np.asarray(self.harmonics[5][idx_start:idx_end])
-
-            full_harm = [f3,f5,f7,f7,f9,f11,f3]
-            data.xdata[:] = fulldata_x[:]
-            data.harmonics= full_harm
-
-        return self.data_line_list
-
-    def on_enter(self,event):
-        self.active = True
-
-    def on_exit(self,event):
-        self.active = False
-
-    def clear_figure(self):
-        self.axes.cla()
-
-class data_line():
-    def __init__(self, xdata, harmonics,id):
-        self.xdata = xdata
-        self.ydata = harmonics
-        self.harmonics = harmonics
-        self.id = id
+            result = self.fn(*self.args)
+        except Exception as error:
+            if not self.cancelled:
+                self.signals.error.emit(error)
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(result)
 
-class MyDynamicMplCanvas(MyMplCanvas):
-    """A canvas that updates itself every second with a new plot."""
-
-    def __init__(self, *args, **kwargs):
-        MyMplCanvas.__init__(self, *args, **kwargs)
-        timer = QtCore.QTimer(self)
-        timer.timeout.connect(self.update_figure)
-        timer.start(1000)
-
-    def compute_initial_figure(self):
-        self.axes.plot([0, 1, 2, 3], [1, 2, 0, 4], 'r')
-
-    def update_figure(self):
-        # Build a list of 4 random integers between 0 and 10 (both inclusive)
-        l = [random.randint(0, 10) for i in range(4)]
-
-        self.axes.plot([0, 1, 2, 3], l, 'r')
-        self.draw()
+    def cancel(self):
+        self.cancelled = True
 
 
 class ApplicationWindow(QtWidgets.QMainWindow):
@@ -357,6 +76,8 @@ class ApplicationWindow(QtWidgets.QMainWindow):
 
         self.file_menu = QtWidgets.QMenu('&File', self)
         self.file_menu.addAction('Open', self.file_open)
+        self.file_menu.addAction('Follow Live File', self.file_follow)
+        self.file_menu.addAction('Stop Following', self.stop_following)
         self.file_menu.addAction('&Quit', self.fileQuit,
                                  QtCore.Qt.CTRL + QtCore.Qt.Key_Q)
 
@@ -370,6 +91,34 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.reset_zoom = QtWidgets.QPushButton('Reset Zoom', self)
         self.reset_zoom.clicked.connect(self.zoom_reset)
 
+        self.analysis_menu = QtWidgets.QMenu('&Analysis', self)
+        self.analysis_menu.addAction('Baseline...', self.set_baseline)
+        self.analysis_menu.addSeparator()
+        self.analysis_menu.addAction('Rolling Slope...', self.show_rolling)
+        self.analysis_menu.addAction('Hide Rolling Slope', self.hide_rolling)
+        self.analysis_menu.addSeparator()
+        self.analysis_menu.addAction('Find Linear Regions', self.find_linear_regions)
+        self.analysis_menu.addAction('Bootstrap Intervals...', self.set_bootstrap)
+        self.engine_menu = self.analysis_menu.addMenu('Fit Engine')
+        self.engine_group = QtWidgets.QActionGroup(self)
+        for engine, (label, fit) in FIT_ENGINES.items():
+            action = self.engine_menu.addAction(label)
+            action.setCheckable(True)
+            action.setChecked(engine == 'ols')
+            action.setData(engine)
+            self.engine_group.addAction(action)
+        self.engine_group.triggered.connect(lambda action: self.set_fit_engine(action.data()))
+        self.menuBar().addMenu(self.analysis_menu)
+
+        self.profile_menu = QtWidgets.QMenu('&Profile', self)
+        self.profile_action = self.profile_menu.addAction('Record Timings')
+        self.profile_action.setCheckable(True)
+        self.profile_action.setChecked(profiler.enabled)
+        self.profile_action.toggled.connect(self.set_profiling)
+        self.profile_menu.addAction('Reset Timings', profiler.reset)
+        self.profile_menu.addAction('Save Trace...', self.save_profile)
+        self.menuBar().addMenu(self.profile_menu)
+
         self.help_menu = QtWidgets.QMenu('&Help', self)
         self.menuBar().addSeparator()
         self.menuBar().addMenu(self.help_menu)
@@ -383,25 +132,25 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.l = QtWidgets.QVBoxLayout()
         table_vbox = QtWidgets.QVBoxLayout()
         main_box = QtWidgets.QHBoxLayout(self.main_widget)
-        self.freq_graph = QCMDGraphTableLayout(self.main_widget)
-        self.diss_graph = QCMDGraphTableLayout(self.main_widget)
+        self.fit_cache = FitResultCache()
+        self.freq_graph = QCMDGraphTableLayout(self.main_widget, 'frequency', self.fit_cache)
+        self.diss_graph = QCMDGraphTableLayout(self.main_widget, 'dissipation', self.fit_cache)
+        #A selection drawn on either tab is fitted on both quantities
+        self.freq_graph.linked.append(self.diss_graph)
+        self.diss_graph.linked.append(self.freq_graph)
         tab.addTab(self.freq_graph, "Frequency")
         tab.addTab(self.diss_graph, "Dissipation")
         self.graph_selection_box = GraphHarmonicSelectionBox(self.freq_graph, self.diss_graph)
         self.harmonic_check_box = HarmonicSelectionBox()
         self.l.addWidget(tab)
 
-        #dc = MyDynamicMplCanvas(self.main_widget, width=5, height=4, dpi=100)
-        #l.addWidget(self.sc)
         self.l.addWidget(self.graph_selection_box)
         self.l.addWidget(self.button)
         self.l.addWidget(self.reset_zoom)
 
 
-        self.values = list()
-        self.initial_table_values = [" "," "," "," "," "," "]
-        self.values.append(self.initial_table_values)
-        self.headers = [['ID ','Slope', 'Intercept', 'R value', 'P value', 'K2 ', 'P val Error']]
+        self.values = empty_results()
+        self.headers = [RESULT_HEADERS]
         self.values_model = DataValuesModel(self.values, self.headers)
         values_table = DataValuesTableView(self.values_model)
 
@@ -410,7 +159,27 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.l.addWidget(self.export_button)
         main_box.addLayout(self.l)
 
-        #l.addWidget(dc)
+        self.thread_pool = QtCore.QThreadPool()
+        self.load_worker = None
+        self.fit_worker = None
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.setMaximumWidth(150)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        #Latency of the last drag, redraw and fit while timings are recorded
+        self.latency_label = QtWidgets.QLabel()
+        self.statusBar().addPermanentWidget(self.latency_label)
+        self.latency_timer = QtCore.QTimer(self)
+        self.latency_timer.timeout.connect(self.show_latency)
+        self.set_profiling(profiler.enabled)
+        self.follower = None
+        self.baseline = None
+        self.loaded_file = None
+        self.dataset = None
+        self.plotted_rows = 0
+        self.follow_timer = QtCore.QTimer(self)
+        self.follow_timer.timeout.connect(self.follow_update)
         self.statusBar().showMessage("Welcome to QCMD Data Analyser", 4000)
         self.main_widget.setFocus()
         self.setCentralWidget(self.main_widget)
@@ -418,49 +187,275 @@ class ApplicationWindow(QtWidgets.QMainWindow):
 
 
     def file_open(self):
+        self.load_file(self.open_file)
 
-        file_dialog = QtWidgets.QFileDialog.getOpenFileName(self, 'Open file', '.')
-        filename = ''.join(file_dialog)
+    def file_follow(self):
+        self.load_file(self.open_follower)
+
+    def open_file(self, filename):
+        return open_reader(filename, self.baseline)
+
+    def open_follower(self, filename):
+        follower = QCMDDataFollower(filename, self.baseline)
+        follower.poll()
+        return follower
 
-        reader = QCMDDataReader(filename)
+    def load_file(self, open_reader):
+        file_dialog = QtWidgets.QFileDialog.getOpenFileName(self, 'Open file', '.')
+        filename = ''.join(file_dialog[:1])
+        if not filename:
+            return
+        self.start_loading(open_reader, filename)
+
+    def start_loading(self, open_reader, filename):
+        self.stop_following()
+        self.loaded_file = (open_reader, filename)
+        #Opening another file mid-load drops the earlier result
+        if self.load_worker is not None:
+            self.load_worker.cancel()
+        self.cancel_fit()
+        self.load_worker = Worker(open_reader, filename)
+        self.load_worker.signals.finished.connect(
+            lambda reader, worker=self.load_worker: self.file_loaded(worker, reader))
+        self.load_worker.signals.error.connect(
+            lambda error, worker=self.load_worker: self.worker_failed(worker, error))
+        self.start_worker(self.load_worker, "Loading " + os.path.basename(filename) + "...")
+
+    def file_loaded(self, worker, reader):
+        if worker is not self.load_worker:
+            return
+        self.load_worker = None
+        self.worker_done()
+        self.show_reader(reader)
+        if isinstance(reader, QCMDDataFollower):
+            self.follower = reader
+            self.follow_timer.start(1000)
+            self.statusBar().showMessage("Following " + os.path.basename(reader.filename))
+
+    @timed('show_reader')
+    def show_reader(self, reader):
+        #Both tabs share one dataset, time axis, index and harmonic views
+        dataset = QCMDDataset.from_reader(reader)
+        self.plotted_rows = len(dataset.get_time())
+        if not self.plotted_rows:
+            return
+        #Fits still running were taken from the previous dataset
+        self.cancel_fit()
+        self.fit_cache.clear()
         self.freq_graph.clear_figure()
         self.diss_graph.clear_figure()
+        self.dataset = dataset
+        if len(dataset.sensors) > 1:
+            self.statusBar().showMessage("{} sensors, plotting S1, fits cover every sensor".format(
+                len(dataset.sensors)), 4000)
         harmonics = self.graph_selection_box.get_checkboxes_values()
-        self.freq_graph.initialise_graph(reader.get_time(), reader.get_harmonics(), harmonics)
-        self.diss_graph.initialise_graph(reader.get_time(), reader.get_dissapation(),harmonics)
-        self.values = list()
-        self.values.append(self.initial_table_values)
+        self.freq_graph.initialise_graph(self.dataset, harmonics)
+        self.diss_graph.initialise_graph(self.dataset, harmonics)
+        self.values = empty_results()
         self.values_model.set_values(self.values)
 
+    #Polled by follow_timer, only the rows appended since the last poll are parsed and plotted
+    def follow_update(self):
+        if self.follower is None:
+            return
+        self.follower.poll()
+        time = self.follower.get_time()
+        if self.follower.restarted or not self.plotted_rows:
+            self.follower.restarted = False
+            self.show_reader(self.follower)
+        elif len(time) > self.plotted_rows:
+            self.plotted_rows = len(time)
+            self.dataset.extend(time, self.follower.get_harmonics(), self.follower.get_dissapation())
+            self.freq_graph.append_samples()
+            self.diss_graph.append_samples()
+
+    def stop_following(self):
+        if self.follower is not None:
+            self.follow_timer.stop()
+            self.follower = None
+            self.statusBar().showMessage("Stopped following", 4000)
+
 
     def print_selection(self):
-        self.diss_graph.fit_selected_values(self.harmonic_check_box.get_checkboxes_values())
-        self.freq_graph.fit_selected_values(self.harmonic_check_box.get_checkboxes_values())
+        harmonic_check = self.harmonic_check_box.get_checkboxes_values()
+        freq_data = self.freq_graph.get_selected_data()
+        diss_data = self.diss_graph.get_selected_data()
+
+        self.cancel_fit()
+        #Everything the worker needs is read here, so changes made while it runs only affect the next fit
+        self.fit_worker = Worker(self.calculate_fits, freq_data, diss_data, harmonic_check,
+                                 self.freq_graph.fit_settings(), self.diss_graph.fit_settings())
+        self.fit_worker.signals.finished.connect(
+            lambda values, worker=self.fit_worker: self.fits_calculated(worker, values))
+        self.fit_worker.signals.error.connect(
+            lambda error, worker=self.fit_worker: self.worker_failed(worker, error))
+        self.start_worker(self.fit_worker, "Fitting selections...")
+
+    def calculate_fits(self, freq_data, diss_data, harmonic_check, freq_settings, diss_settings):
+        return (self.freq_graph.calculate_values(freq_data, harmonic_check, freq_settings),
+                self.diss_graph.calculate_values(diss_data, harmonic_check, diss_settings))
+
+    def cancel_fit(self):
+        if self.fit_worker is not None:
+            self.fit_worker.cancel()
+            self.fit_worker = None
+            self.worker_done()
+
+    def fits_calculated(self, worker, values):
+        if worker is not self.fit_worker:
+            return
+        self.fit_worker = None
+        self.worker_done()
+        freq_values, diss_values = values
+        self.freq_graph.show_fit_values(freq_values)
+        self.diss_graph.show_fit_values(diss_values)
+
+    def start_worker(self, worker, message):
+        self.statusBar().showMessage(message)
+        self.progress_bar.show()
+        self.thread_pool.start(worker)
+
+    def worker_done(self):
+        if self.load_worker is None and self.fit_worker is None:
+            self.progress_bar.hide()
+            self.statusBar().clearMessage()
+
+    def worker_failed(self, worker, error):
+        if worker is self.load_worker:
+            self.load_worker = None
+        elif worker is self.fit_worker:
+            self.fit_worker = None
+        else:
+            return
+        self.worker_done()
+        self.statusBar().showMessage("Error: " + str(error), 4000)
 
 
     def export_csv(self):
 
-        file_dialog = QtWidgets.QFileDialog.getSaveFileName(self, 'Save file','.', '.csv')
-        filename =''.join(file_dialog)
-        freq_values = self.freq_graph.get_fit_results()
-        diss_values = self.diss_graph.get_fit_results()
+        file_dialog = QtWidgets.QFileDialog.getSaveFileName(self, 'Save file', '.',
+                                                            'CSV files (*.csv);;Compressed NumPy (*.npz)')
+        filename, file_filter = file_dialog
+        if not filename:
+            return
+        if not os.path.splitext(filename)[1]:
+            filename += '.npz' if 'npz' in file_filter else '.csv'
+        results = {'frequency': self.freq_graph.fit_values, 'dissipation': self.diss_graph.fit_values}
+        selections = {'frequency': self.freq_graph.get_selected_data(),
+                      'dissipation': self.diss_graph.get_selected_data()}
         try:
-            with open(filename, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile, delimiter=',')
-                writer.writerow()
-                for line in freq_values:
-                    writer.writerow(line)
-                writer.writerow("")
-                writer.writerow(self.headers[0])
-                for line in diss_values:
-                    writer.writerow(line)
-                self.statusBar().showMessage("File Saved!", 4000)
-        except FileNotFoundError:
-            print("File not found")
-
-
-
-
+            export_results(filename, results, selections)
+            self.statusBar().showMessage("File Saved!", 4000)
+        except OSError as error:
+            self.statusBar().showMessage("Could not save file: " + str(error), 4000)
+
+    def show_rolling(self):
+        width, accepted = QtWidgets.QInputDialog.getInt(self, 'Rolling Slope', 'Window width (samples):',
+                                                        500, 3, 10 ** 8)
+        if not accepted:
+            return
+        stride, accepted = QtWidgets.QInputDialog.getInt(self, 'Rolling Slope', 'Step between windows (samples):',
+                                                         max(1, width // 10), 1, 10 ** 8)
+        if not accepted:
+            return
+        self.freq_graph.show_rolling(width, stride)
+        self.diss_graph.show_rolling(width, stride)
+
+    def hide_rolling(self):
+        self.freq_graph.show_rolling(None)
+        self.diss_graph.show_rolling(None)
+
+    #Chosen per run, the open file is read again with the new baseline
+    def set_baseline(self):
+        labels = ['None', 'First sample', 'Reference window mean', 'Drift line']
+        current = BASELINE_MODES.index(self.baseline.mode) if self.baseline is not None else 0
+        label, accepted = QtWidgets.QInputDialog.getItem(self, 'Baseline', 'Subtract from every channel:',
+                                                         labels, current, False)
+        if not accepted:
+            return
+        mode = BASELINE_MODES[labels.index(label)]
+        window = None
+        if mode in ('window', 'drift'):
+            window = self.ask_reference_window()
+            if window is None:
+                return
+        self.baseline = BaselineCorrection(mode, window)
+        if self.loaded_file is not None:
+            self.start_loading(*self.loaded_file)
+
+    def ask_reference_window(self):
+        if self.baseline is not None and self.baseline.window is not None:
+            start, end = self.baseline.window
+        elif self.dataset is not None:
+            time = self.dataset.get_time()
+            start, end = time[0], time[0] + (time[-1] - time[0]) / 10
+        else:
+            start, end = 0.0, 1.0
+        start, accepted = QtWidgets.QInputDialog.getDouble(self, 'Baseline', 'Reference window start time:',
+                                                           start, -1e9, 1e9, 4)
+        if not accepted:
+            return None
+        end, accepted = QtWidgets.QInputDialog.getDouble(self, 'Baseline', 'Reference window end time:',
+                                                         max(end, start), start, 1e9, 4)
+        if not accepted:
+            return None
+        return (start, end)
+
+    def set_bootstrap(self):
+        current = self.freq_graph.bootstrap
+        resamples, accepted = QtWidgets.QInputDialog.getInt(
+            self, 'Bootstrap Intervals', 'Resamples per fit, 0 for none:',
+            current.resamples if current is not None else 1000, 0, 10 ** 6)
+        if not accepted:
+            return
+        bootstrap = None
+        if resamples:
+            #Blocks longer than one sample keep correlated noise together
+            block, accepted = QtWidgets.QInputDialog.getInt(
+                self, 'Bootstrap Intervals', 'Block length (samples):',
+                current.block if current is not None else 1, 1, 10 ** 6)
+            if not accepted:
+                return
+            bootstrap = BootstrapIntervals(max(resamples, 2), block=block)
+        self.freq_graph.bootstrap = bootstrap
+        self.diss_graph.bootstrap = bootstrap
+
+    def set_fit_engine(self, engine):
+        self.freq_graph.fit_engine = engine
+        self.diss_graph.fit_engine = engine
+        if engine != 'ols' and self.freq_graph.bootstrap is not None:
+            self.statusBar().showMessage("Bootstrap intervals are only computed for least squares fits", 4000)
+
+    def find_linear_regions(self):
+        found = [len(self.freq_graph.propose_selections()), len(self.diss_graph.propose_selections())]
+        self.statusBar().showMessage("Proposed {} frequency and {} dissipation regions".format(*found), 4000)
+
+    def set_profiling(self, enabled):
+        profiler.enable(enabled)
+        self.latency_label.setVisible(enabled)
+        if enabled:
+            self.latency_timer.start(500)
+        else:
+            self.latency_timer.stop()
+
+    def show_latency(self):
+        parts = list()
+        for label, stage in (('drag', 'update_graph'), ('draw', 'draw'), ('fit', 'calculate_values')):
+            last = profiler.last(stage)
+            if last is not None:
+                parts.append("{} {:.1f} ms".format(label, last * 1e3))
+        self.latency_label.setText("  ".join(parts))
+
+    def save_profile(self):
+        filename, file_filter = QtWidgets.QFileDialog.getSaveFileName(self, 'Save trace', '.',
+                                                                      'Trace files (*.json)')
+        if not filename:
+            return
+        try:
+            profiler.dump(filename)
+            self.statusBar().showMessage("Trace Saved!", 4000)
+        except OSError as error:
+            self.statusBar().showMessage("Could not save trace: " + str(error), 4000)
 
     def zoom_reset(self):
         self.sc.reset_zoom()
@@ -487,15 +482,34 @@ between qt4 and qt5"""
                                 )
 
 class QCMDGraphTableLayout(QtWidgets.QWidget):
-    def __init__(self, main_widget):
+    """Graph and fit table of one quantity.
+
+    The canvas is only built once the tab is first shown, a dataset given
+    before then is plotted at that point.
+    """
+    def __init__(self, main_widget, quantity=None, fit_cache=None):
         super(QCMDGraphTableLayout, self).__init__()
-        hbox = QtWidgets.QHBoxLayout()
-        self.graph = QCMDDataPlotter(main_widget, width=5, height=4,
-                                  dpi=100)
-        self.values = list()
-        self.initial_table_values = [" ", " ", " ", " ", " ", " "]
-        self.values.append(self.initial_table_values)
-        self.headers = [['ID ', 'Slope', 'Intercept', 'R value', 'P value', 'K2 ', 'P val Error']]
+        self.hbox = QtWidgets.QHBoxLayout()
+        self.main_widget = main_widget
+        self.quantity = quantity
+        #The tab's own quantity or one of the channels derived from it
+        self.channel = quantity
+        self.fit_cache = fit_cache
+        #BootstrapIntervals adding confidence intervals to every fit, or None
+        self.bootstrap = None
+        #Layouts of the same dataset sharing this one's selections
+        self.linked = list()
+        #(start, end) sample window of every selection, kept here so a tab never shown still fits them
+        self.windows = list()
+        #Name of the FIT_ENGINES entry fitting the selections
+        self.fit_engine = 'ols'
+        self.graph = None
+        self.dataset = None
+        self.check_values = None
+        self.rolling = None
+        self.values = empty_results()
+        self.fit_values = empty_results()
+        self.headers = [RESULT_HEADERS]
         self.values_model = DataValuesModel(self.values, self.headers)
         self.values_table = DataValuesTableView(self.values_model)
 
@@ -505,103 +519,260 @@ class QCMDGraphTableLayout(QtWidgets.QWidget):
 
 
 
-        hbox.addWidget(self.graph)
-        hbox.addWidget(self.values_table)
-        self.setLayout(hbox)
+        self.hbox.addWidget(self.values_table)
+        self.setLayout(self.hbox)
+
+    def showEvent(self, event):
+        super(QCMDGraphTableLayout, self).showEvent(event)
+        if self.graph is None:
+            #Left to the event loop so the window is painted before matplotlib loads
+            QtCore.QTimer.singleShot(0, self.create_graph)
+
+    @timed('create_graph')
+    def create_graph(self):
+        if self.graph is not None:
+            return
+        from QCMDPlotter import QCMDDataPlotter
+        self.graph = QCMDDataPlotter(self.main_widget, width=5, height=4,
+                                     dpi=100)
+        self.graph.fit_cache = self.fit_cache
+        self.graph.selections_changed = self.share_selections
+        self.hbox.insertWidget(0, self.graph)
+        if self.dataset is not None:
+            self.initialise_graph(self.dataset, self.check_values)
+            #Selections made on the other tabs before this graph existed
+            if self.windows:
+                self.graph.set_selection_windows(self.windows)
 
     def get_graph(self):
+        self.create_graph()
         return self.graph
 
+    def share_selections(self):
+        self.windows = self.graph.selection_windows()
+        for layout in self.linked:
+            if layout.dataset is self.dataset:
+                layout.windows = list(self.windows)
+                if layout.graph is not None:
+                    layout.graph.set_selection_windows(self.windows)
+
     def clear_figure(self):
-        self.graph.clear_figure()
+        self.dataset = None
+        self.windows = list()
+        if self.graph is not None:
+            self.graph.clear_figure()
 
-    def initialise_graph(self,time, harmonics, check_values):
-        self.graph.compute_initial_figure(time, harmonics, check_values)
+    def initialise_graph(self, dataset, check_values):
+        self.dataset = dataset
+        self.check_values = check_values
+        if self.graph is not None:
+            self.graph.compute_initial_figure(dataset, self.channel, check_values)
+            if self.rolling is not None:
+                self.show_rolling(*self.rolling)
 
 
     def update_graph(self,check_values):
-        self.graph.redraw_harmonics(check_values)
+        self.check_values = check_values
+        if self.graph is not None:
+            self.graph.redraw_harmonics(check_values)
+
+    def append_samples(self):
+        if self.graph is not None:
+            self.graph.append_samples()
+
+    def set_channel(self, channel):
+        """Plots and fits channel in place of the harmonics shown so far."""
+        if channel == self.channel:
+            return
+        self.channel = channel
+        if self.graph is not None and self.graph.dataset is not None:
+            self.graph.set_channel(channel)
+            if self.rolling is not None:
+                self.show_rolling(*self.rolling)
+
+    def show_rolling(self, width, stride=1):
+        """Rolling slope layer of width samples, or none when width is None."""
+        self.rolling = None if width is None else (width, stride)
+        if self.graph is None or self.graph.dataset is None:
+            return
+        if width is None:
+            self.graph.hide_rolling()
+        else:
+            self.graph.plot_rolling(width, stride)
+            self.graph.refresh_lod()
+        self.graph.draw()
+
+    def propose_selections(self):
+        """Adds the linear regions of the shown harmonics as selections."""
+        if self.dataset is None:
+            return []
+        return self.get_graph().propose_selections()
 
     def fit_selected_values(self, harmonic_check):
-        data_list = self.graph.get_selected_data()
+        data_list = self.get_selected_data()
 
         if not data_list:
            return
         else:
+            self.show_fit_values(self.calculate_values(data_list, harmonic_check))
+
+    #Copies of the selections, so a fit running in the background is not changed by later edits
+    @timed('get_selected_data')
+    def get_selected_data(self):
+        if self.dataset is None:
+            return list()
+        selections = list()
+        for line_id, (start, end) in enumerate(self.windows, 1):
+            #Views of every harmonic over the selected window, in checkbox order
+            xdata, harmonics = self.dataset.window_data(self.channel, start, end)
+            data = data_line(xdata, harmonics, line_id)
+            data.idx_start, data.idx_end = start, end
+            data.channel = self.channel
+            selections.append(data)
+        return selections
+
+    def show_fit_values(self, fit_values):
+        if not len(fit_values):
+            return
+        self.fit_values = fit_values
+        self.values_model.set_values(self.fit_values)
+        self.values_table.resizeColumnsToContents()
 
-            self.fit_values = self.calculate_values(data_list, harmonic_check)
-            self.values_model.set_values(self.fit_values)
-            self.values_table.resizeColumnsToContents()
 
+    def fit_settings(self):
+        """The dataset, fit engine and bootstrap the selections are fitted with."""
+        return self.dataset, self.fit_engine, self.bootstrap
 
-    def calculate_values(self, data_list, harmonic_check):
+    @timed('calculate_values')
+    def calculate_values(self, data_list, harmonic_check, settings=None):
+        """Records of data_list, fitted with settings from fit_settings or the current ones."""
+        if not data_list:
+            return empty_results()
+        dataset, fit_engine, bootstrap = settings or self.fit_settings()
+        sensors = dataset.sensors
+        if len(sensors) == 1:
+            return self.fit_sensor(sensors[0], dataset, data_list, harmonic_check, fit_engine, bootstrap)
+        #The same windows on every sensor, numpy drops the GIL in the sums so the sensors fit in parallel
+        with ThreadPoolExecutor(max_workers=min(len(sensors), os.cpu_count() or 1)) as executor:
+            values = list(executor.map(lambda sensor: self.fit_sensor(sensor, dataset, data_list, harmonic_check,
+                                                                      fit_engine, bootstrap), sensors))
+        return np.concatenate(values)
+
+    def fit_sensor(self, sensor, dataset, data_list, harmonic_check, fit_engine='ols', bootstrap=None):
         values = list()
         for index, data in enumerate(data_list):
-            for harmonic, check in zip(data.harmonics, harmonic_check):
-                if check:
-                    slope, intercept, r_value, p_value, std_err = stats.linregress(data.xdata, harmonic)
-
-                    line_fit_func = np.vectorize(self.generate_line_fit)
-                    line_fit = line_fit_func(data.xdata, slope, intercept)
-
-                    difference = np.subtract(data.harmonics[0], line_fit)
-                    k2, p_norm_value = stats.normaltest(difference)
-                    rounded = list()
-                    id = check + " " + str(index + 1)
-                    rounded.append(id)
-                    float_values = [slope, intercept, r_value, p_value, k2, p_norm_value]
-                    for value in float_values:
-                        rounded.append(str(round(value, 3)))
-                    values.append(rounded)
-        return values
-
-    def generate_line_fit(self, x, slope, intercept):
-        y = slope * x + intercept
-        return y
+            channel = data.channel
+            if sensor is dataset:
+                start, end, xdata, harmonics = data.idx_start, data.idx_end, data.xdata, data.harmonics
+            else:
+                start, end = sensor.matching_window(dataset, data.idx_start, data.idx_end)
+                xdata, harmonics = sensor.window_data(channel, start, end)
+            if fit_engine == 'ols':
+                names, fits = self.fit_window(sensor, channel, start, end, xdata, harmonics, harmonic_check)
+            else:
+                names, fits = self.fit_window(sensor, channel, start, end, xdata, harmonics, harmonic_check,
+                                              FIT_ENGINES[fit_engine][1], 6, fit_engine)
+            #The bootstrap resamples least squares lines, so other engines get no intervals
+            intervals = None
+            if bootstrap is not None and fit_engine == 'ols':
+                names, intervals = self.fit_window(sensor, channel, start, end, xdata, harmonics, harmonic_check,
+                                                   bootstrap, 4, bootstrap.key())
+            if fit_engine != 'ols':
+                names = [fit_engine + " " + name for name in names]
+            if channel in DERIVED_CHANNELS:
+                names = [DERIVED_CHANNELS[channel][1] + " " + name for name in names]
+            if len(sensor.sensors) > 1:
+                names = [sensor.label + " " + name for name in names]
+            values.append(result_records(names, fits, index + 1, intervals))
+        return np.concatenate(values)
+
+    #All checked harmonics of a selection are fitted in one pass, cached ones are skipped
+    def fit_window(self, sensor, channel, start, end, xdata, harmonics, harmonic_check, fit=fit_lines, fields=6,
+                   tag=None):
+        if self.fit_cache is None or start is None:
+            return fit_checked(xdata, harmonics, harmonic_check, fit, fields)
+        return self.fit_cache.fit_window(sensor.id, start, end, channel, xdata, harmonics, harmonic_check,
+                                         fit, fields, tag)
+
     def get_fit_results(self):
-        return self.fit_values
+        return format_records(self.fit_values)
+
+
+def open_reader(filename, baseline=None):
+    """Reader for either an analyser export or a tab delimited multi-sensor export.
+
+    Without a baseline each reader keeps its own default, none for an
+    analyser export and the first sample for a multi-sensor one.
+    """
+    if is_sensor_export(filename):
+        return QCMDSensorReader(filename, '\t', baseline=baseline)
+    return QCMDDataReader(filename, baseline=baseline)
 
 
 class QCMDDataReader():
-    def __init__(self, filename):
-
-        csvfile = open(filename, newline="")
-        reader = csv.reader(csvfile, delimiter=',')
-        self.time = list()
-        f3 = list()
-        f5 = list()
-        f7 = list()
-        f9 = list()
-        f11 = list()
-        f13 = list()
-        d3 = list()
-        d5 =list()
-        d7 = list()
-        d9= list()
-        d11 = list()
-        d13 = list()
-
-        for row in reader:
-            if len(row) > 0:
-                try:
-                    self.time.append(float(row[0]))
-                    f3.append(float(row[1]))
-                    f5.append(float(row[2]))
-                    f7.append(float(row[3]))
-                    f9.append(float(row[4]))
-                    f11.append(float(row[5]))
-                    f13.append(float(row[6]))
-                    d3.append(float(row[7]))
-                    d5.append(float(row[8]))
-                    d7.append(float(row[9]))
-                    d9.append(float(row[10]))
-                    d11.append(float(row[11]))
-                    d13.append(float(row[12]))
-
-                except ValueError:
-                    pass
-        self.harmonics = [f3, f5, f7, f9, f11, f13]
-        self.dissapation = [d3,d5,d7,d9,d11,d13]
+    num_columns = 13
+
+    @timed('file_open')
+    def __init__(self, filename, use_cache=True, baseline=None):
+        self.data = None
+        if use_cache:
+            cache = QCMDDataCache(filename)
+            key = cache.source_key()
+            self.data = cache.load(key)
+
+        if self.data is None:
+            with open(filename, newline="") as csvfile:
+                lines = csvfile.read().splitlines()
+
+            #One float64 block, column-major so every channel is a contiguous view
+            self.data = self.parse_lines(lines)
+            #The cache keeps the values as read, the baseline belongs to this run only
+            if use_cache:
+                cache.save(self.data, key)
+
+        if baseline is not None:
+            self.data = baseline(self.data)
+        self.data.flags.writeable = False
+        self.time = self.data[:, 0]
+        self.harmonics = [self.data[:, col] for col in range(1, 7)]
+        self.dissapation = [self.data[:, col] for col in range(7, 13)]
+
+    def parse_lines(self, lines):
+        #Header rows sit at the top and blank rows at the bottom, trim those and
+        #hand the rest to numpy in one go
+        start = 0
+        end = len(lines)
+        while start < end and not self.is_data_row(lines[start]):
+            start += 1
+        while end > start and not self.is_data_row(lines[end - 1]):
+            end -= 1
+        try:
+            data = self.load_rows(lines[start:end])
+        except ValueError:
+            #Quoted fields or stray rows in the middle of the file, read and skip them like the csv loop did
+            data = self.read_rows(lines[start:end])
+        return np.asfortranarray(data)
+
+    def load_rows(self, lines):
+        if not lines:
+            return np.empty((0, self.num_columns))
+        return np.loadtxt(lines, delimiter=',', usecols=range(self.num_columns), ndmin=2)
+
+    def read_rows(self, lines):
+        rows = [values for values in map(self.row_values, csv.reader(lines)) if values is not None]
+        return np.array(rows, dtype=np.float64).reshape(-1, self.num_columns)
+
+    def row_values(self, row):
+        """The first num_columns fields of a csv row as floats, or None if it is not a data row."""
+        if len(row) < self.num_columns:
+            return None
+        try:
+            return [float(value) for value in row[:self.num_columns]]
+        except ValueError:
+            return None
+
+    def is_data_row(self, line):
+        return self.row_values(next(csv.reader([line]), [])) is not None
 
     def get_harmonics(self):
         return self.harmonics
@@ -614,6 +785,73 @@ class QCMDDataReader():
 
 
 
+class QCMDDataFollower(QCMDDataReader):
+    """Follow mode for a file the instrument is still writing.
+
+    Each poll reads only the bytes appended since the previous one, parses the
+    complete rows and appends them to growable arrays. A partial last line is
+    kept until the rest of it arrives.
+    """
+    def __init__(self, filename, baseline=None):
+        self.filename = filename
+        self.baseline = baseline
+        #Fitted once the run covers the reference, rows before that are corrected together
+        self.reference = None
+        self.position = 0
+        self.partial = b''
+        self.restarted = False
+        self.buffer = GrowableArray(self.num_columns)
+        self.update_views()
+
+    @timed('follow_poll')
+    def poll(self):
+        try:
+            size = os.path.getsize(self.filename)
+        except OSError:
+            return 0
+        if size < self.position:
+            #The file was replaced, read it again from the top
+            self.position = 0
+            self.partial = b''
+            self.buffer.truncate(0)
+            self.reference = None
+            self.restarted = True
+        if size == self.position:
+            return 0
+
+        with open(self.filename, 'rb') as datafile:
+            datafile.seek(self.position)
+            chunk = datafile.read(size - self.position)
+        self.position += len(chunk)
+        lines = (self.partial + chunk).split(b'\n')
+        self.partial = lines.pop()
+        rows = self.parse_lines([line.decode('latin-1').rstrip('\r') for line in lines])
+        if len(rows):
+            if self.reference is not None:
+                rows = self.baseline.apply(rows, self.reference)
+            self.buffer.append(rows)
+            if self.baseline is not None and self.reference is None:
+                self.correct_buffer()
+            self.update_views()
+        return len(rows)
+
+    def correct_buffer(self):
+        data = self.buffer.view()
+        if not self.baseline.ready(data[:, 0]):
+            return
+        self.reference = self.baseline.fit(data)
+        self.baseline.apply(data, self.reference)
+        #Rows already plotted have changed, so the graphs start over
+        if len(self.time):
+            self.restarted = True
+
+    def update_views(self):
+        self.data = self.buffer.view()
+        self.time = self.data[:, 0]
+        self.harmonics = [self.data[:, col] for col in range(1, 7)]
+        self.dissapation = [self.data[:, col] for col in range(7, 13)]
+
+
 class HarmonicSelectionBox(QtWidgets.QGroupBox):
     def __init__(self):
         super(HarmonicSelectionBox, self).__init__()
@@ -659,11 +897,23 @@ class GraphHarmonicSelectionBox(HarmonicSelectionBox):
         self.diss_graph = diss_graph
         for box in self.check_list:
             box.stateChanged.connect(self.set_plot_harmonics)
+        #One channel choice per tab, next to the harmonics it applies to
+        self.channel_boxes = dict()
+        for quantity in QUANTITIES:
+            box = QtWidgets.QComboBox()
+            box.addItems([CHANNEL_LABELS[channel] for channel in TAB_CHANNELS[quantity]])
+            box.currentIndexChanged.connect(lambda index, quantity=quantity: self.set_channel(quantity, index))
+            self.layout().addWidget(box)
+            self.channel_boxes[quantity] = box
 
     def set_plot_harmonics(self):
         self.freq_graph.update_graph(self.get_checkboxes_values())
         self.diss_graph.update_graph(self.get_checkboxes_values())
 
+    def set_channel(self, quantity, index):
+        graph = self.freq_graph if quantity == 'frequency' else self.diss_graph
+        graph.set_channel(TAB_CHANNELS[quantity][index])
+
 
 
 class DataValuesTableView(QtWidgets.QTableView):
@@ -689,36 +939,80 @@ class DataValuesTableView(QtWidgets.QTableView):
         hh = self.horizontalHeader()
         # hh.setStretchLastSection(True)
 
-        # set column width to fit contents
-        #self.resizeColumnsToContents()
+        # only measure the first rows when sizing columns to their contents
+        hh.setResizeContentsPrecision(DataValuesModel.size_hint_rows)
+
+        # sort on header click, starting unsorted
+        hh.setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+        self.setSortingEnabled(True)
 
 class DataValuesModel(QtCore.QAbstractTableModel):
+    """Fit results held as a RESULT_DTYPE structured array.
+
+    Values are only formatted when a visible cell asks for them in data().
+    """
+    size_hint_rows = 50
+
     def __init__(self, datain, headerdata, parent=None, *args):
-        """ datain: a list of lists
+        """ datain: a RESULT_DTYPE structured array
             headerdata: a list of strings
         """
         QtCore.QAbstractTableModel.__init__(self, parent, *args)
-        self.arraydata = datain
+        self.arraydata = np.asarray(datain, dtype=RESULT_DTYPE)
         self.headerdata = headerdata
+        self.sort_column = None
+        self.sort_order = QtCore.Qt.AscendingOrder
 
-    def rowCount(self, parent):
+    def rowCount(self, parent=QtCore.QModelIndex()):
         return len(self.arraydata)
 
-    def columnCount(self, parent):
-        return len(self.arraydata[0])
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.headerdata[0])
 
     def data(self, index, role):
         if not index.isValid():
             return None
         elif role != QtCore.Qt.DisplayRole:
             return None
-        return self.arraydata[index.row()][index.column()]
+        value = self.arraydata[index.row()][index.column()]
+        if index.column() == 0:
+            return str(value)
+        return format_value(value)
 
     def set_values(self, values):
-        # The str() cast is because we don't want to be storing a Qt type in here.
+        values = np.asarray(values, dtype=RESULT_DTYPE)
+        count = len(self.arraydata)
+        #Refits usually only add rows at the end, insert those instead of resetting.
+        #Compared as bytes, so missing intervals (NaN) still match
+        if self.sort_column is None and len(values) >= count and \
+                values[:count].tobytes() == self.arraydata.tobytes():
+            self.append_values(values[count:])
+            return
         self.beginResetModel()
-        self.arraydata = values[:][:]
+        self.arraydata = values.copy()
         self.endResetModel()
+        if self.sort_column is not None:
+            self.sort(self.sort_column, self.sort_order)
+
+    def append_values(self, values):
+        if not len(values):
+            return
+        count = len(self.arraydata)
+        self.beginInsertRows(QtCore.QModelIndex(), count, count + len(values) - 1)
+        self.arraydata = np.concatenate((self.arraydata, values))
+        self.endInsertRows()
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        if column < 0 or column >= len(RESULT_DTYPE.names):
+            return
+        self.sort_column = column
+        self.sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        order_index = np.argsort(self.arraydata[RESULT_DTYPE.names[column]], kind='mergesort')
+        if order == QtCore.Qt.DescendingOrder:
+            order_index = order_index[::-1]
+        self.arraydata = self.arraydata[order_index]
+        self.layoutChanged.emit()
 
     def flags(self, index):
         return QtCore.Qt.ItemIsEditable | QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
@@ -729,36 +1023,6 @@ class DataValuesModel(QtCore.QAbstractTableModel):
         return
 
 
-class TestQCMDDataReader(unittest.TestCase):
-
-    @classmethod
-    def setUpClass(self):
-        self.reader = QCMDDataReader('Book4.csv')
-
-    def test_time_length(self):
-        self.assertEqual(len(self.reader.get_time()), 30983)
-
-    def test_time_values(self):
-        time = self.reader.get_time()
-        self.assertEqual(time[0],-0.59982)
-        self.assertEqual(time[-1], 19.31301)
-
-    def test_harmonics_length(self):
-        self.assertEqual(len(self.reader.get_harmonics()),6)
-
-    def test_harmonic_values(self):
-        harmonic3 = self.reader.get_harmonics()[0]
-        self.assertEqual(harmonic3[0],29.39353)
-        self.assertEqual(harmonic3[-1], 23.21427)
-
-    def test_dissapation_length(self):
-        self.assertEqual(len(self.reader.get_dissapation()),6)
-
-    def test_dissapation_values(self):
-        diss = self.reader.get_dissapation()[0]
-        self.assertEqual(diss[0],-10.17701)
-        self.assertEqual(diss[-1], -12.68919)
-
 if __name__ == "__main__":
     qApp = QtWidgets.QApplication(sys.argv)
 
@@ -766,4 +1030,4 @@ if __name__ == "__main__":
 
     aw.show()
     sys.exit(qApp.exec_())
-    qApp.exec_()
\ No newline at end of file
+    qApp.exec_()
@@ -0,0 +1,91 @@
+"""Baseline subtraction applied to a run as it is loaded.
+
+A run is a (samples, columns) float64 array with time in column 0, as held
+by both readers. Every other column is zeroed against one of
+
+    first   the first sample
+    window  its mean over a reference time window
+    drift   a line fitted over a reference time window, so steady drift is
+            removed from the whole run
+
+Each value column is read and written once. A read-only array, such as a
+memory-mapped cache, is never changed, the corrected values go to a new
+array instead.
+"""
+import numpy as np
+
+from QCMDProfiler import timed
+
+BASELINE_MODES = ('none', 'first', 'window', 'drift')
+
+
+class BaselineCorrection():
+    def __init__(self, mode='first', window=None):
+        if mode not in BASELINE_MODES:
+            raise ValueError("Unknown baseline mode " + repr(mode))
+        if mode in ('window', 'drift') and window is None:
+            raise ValueError("The {} baseline needs a reference window".format(mode))
+        self.mode = mode
+        self.window = None if window is None else (float(window[0]), float(window[1]))
+
+    def __repr__(self):
+        return 'BaselineCorrection({!r}, {!r})'.format(self.mode, self.window)
+
+    @timed('baseline')
+    def __call__(self, data):
+        """Corrected data, the same array when it is writeable."""
+        return self.apply(data, self.fit(data))
+
+    def ready(self, time):
+        """True once time covers the reference, for runs that are still growing."""
+        if self.mode in ('none', 'first'):
+            return len(time) > 0
+        return len(time) > 0 and time[-1] >= self.window[1]
+
+    def fit(self, data):
+        """Offset and slope per value column, slope is None unless removing drift."""
+        columns = data.shape[1] - 1
+        if self.mode == 'none' or not len(data):
+            return np.zeros(columns), None
+        if self.mode == 'first':
+            return np.array(data[0, 1:]), None
+
+        time = data[:, 0]
+        reference = np.flatnonzero((time >= self.window[0]) & (time <= self.window[1]))
+        if not len(reference):
+            raise ValueError("No samples between {} and {}".format(*self.window))
+        values = data[reference, 1:]
+        mean = values.mean(axis=0)
+        if self.mode == 'window':
+            return mean, None
+        centred = time[reference] - time[reference].mean()
+        spread = centred @ centred
+        if spread == 0:
+            return mean, np.zeros(columns)
+        slope = centred @ values / spread
+        return mean - slope * time[reference].mean(), slope
+
+    def apply(self, data, baseline, out=None):
+        """Subtracts baseline from every value column of data into out.
+
+        out defaults to data itself, or a new array when data is read-only.
+        """
+        offset, slope = baseline
+        if out is None:
+            out = data if data.flags.writeable else np.empty_like(data, order='F')
+        if out is not data:
+            out[:, 0] = data[:, 0]
+        if self.mode == 'none':
+            if out is not data:
+                out[:, 1:] = data[:, 1:]
+            return out
+        time = data[:, 0]
+        drift = np.empty(len(data)) if slope is not None else None
+        for column in range(1, data.shape[1]):
+            if drift is None:
+                np.subtract(data[:, column], offset[column - 1], out=out[:, column])
+            else:
+                np.multiply(time, slope[column - 1], out=drift)
+                drift += offset[column - 1]
+                np.subtract(data[:, column], drift, out=out[:, column])
+        return out
@@ -0,0 +1,134 @@
+"""Headless batch fitting of QCMD run files.
+
+Applies one set of saved time windows to every file, fits the frequency and
+dissipation harmonics of each window and writes a single results table in
+the Export CSV layout, or as a .npz archive when the output name ends in
+.npz. Files are spread over a process pool.
+
+    python QCMDBatch.py selections.csv results.csv runs/ other_run.csv
+"""
+import argparse
+import csv
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from QCMDAnalyser import QCMDDataReader
+from QCMDBaseline import BASELINE_MODES, BaselineCorrection
+from QCMDBootstrap import BootstrapIntervals
+from QCMDDataset import QUANTITIES, QCMDDataset
+from QCMDExport import export_results
+from QCMDFitting import empty_results, fit_checked, result_records
+from QCMDRobust import FIT_ENGINES
+
+HARMONIC_NAMES = ['F3', 'F5', 'F7', 'F9', 'F11', 'F13']
+
+
+def load_selections(filename):
+    """Reads (start, end) time windows, one per row, skipping header rows."""
+    windows = list()
+    with open(filename, newline="") as csvfile:
+        for row in csv.reader(csvfile):
+            try:
+                windows.append((float(row[0]), float(row[1])))
+            except (ValueError, IndexError):
+                pass
+    return windows
+
+
+def fit_file(filename, windows, harmonic_check, use_cache=True, baseline=None, bootstrap=None, engine='ols'):
+    """Frequency and dissipation result records for every window of one file.
+
+    Lines are fitted by the named FIT_ENGINES entry. With a bootstrap the
+    records of least squares fits carry its confidence intervals. Returns
+    None for a file with no data rows.
+    """
+    dataset = QCMDDataset.from_reader(QCMDDataReader(filename, use_cache=use_cache, baseline=baseline))
+    if not len(dataset.get_time()):
+        return None
+    name = os.path.basename(filename)
+    fit = FIT_ENGINES[engine][1]
+    if engine != 'ols':
+        name = name + " " + engine
+    results = dict()
+    for quantity in QUANTITIES:
+        records = [empty_results()]
+        for number, (start, end) in enumerate(windows, 1):
+            idx_start, idx_end = dataset.window(start, end)
+            time, window = dataset.window_data(quantity, idx_start, idx_end)
+            names, fits = fit_checked(time, window, harmonic_check, fit)
+            intervals = None
+            if bootstrap is not None and engine == 'ols':
+                names, intervals = fit_checked(time, window, harmonic_check, bootstrap, 4)
+            records.append(result_records([name + " " + check for check in names], fits, number, intervals))
+        results[quantity] = np.concatenate(records)
+    return results
+
+
+def run_batch(filenames, windows, harmonic_check, output, workers=None, use_cache=True, baseline=None,
+              bootstrap=None, engine='ols'):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(fit_file, filenames, repeat(windows), repeat(harmonic_check),
+                                    repeat(use_cache), repeat(baseline), repeat(bootstrap), repeat(engine)))
+    #Files without data rows, such as notes next to the runs, are reported and left out
+    for filename, result in zip(filenames, results):
+        if result is None:
+            print("Skipped {}: no data rows".format(filename), file=sys.stderr)
+    results = [result for result in results if result is not None]
+
+    combined = dict((quantity, np.concatenate([empty_results()] + [result[quantity] for result in results]))
+                    for quantity in QUANTITIES)
+    export_results(output, combined)
+    return combined
+
+
+def expand_filenames(paths, output, selections=None):
+    """Run files of paths, leaving out the output and selections files a directory may also hold."""
+    filenames = list()
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted(glob.glob(os.path.join(path, '*.csv'))))
+        else:
+            filenames.append(path)
+    excluded = [os.path.abspath(name) for name in (output, selections) if name]
+    return [name for name in filenames if os.path.abspath(name) not in excluded]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit saved selections across many QCMD files.")
+    parser.add_argument('selections', help="csv file of start,end times")
+    parser.add_argument('output', help="combined results csv")
+    parser.add_argument('paths', nargs='+', help="run files or directories of run files")
+    parser.add_argument('--harmonics', nargs='+', default=['F3'], choices=HARMONIC_NAMES)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--baseline', choices=BASELINE_MODES, default='none',
+                        help="subtract the first sample, a reference window mean or a drift line")
+    parser.add_argument('--reference', nargs=2, type=float, metavar=('START', 'END'),
+                        help="reference time window of the window and drift baselines")
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='RESAMPLES',
+                        help="add bootstrap confidence intervals from this many resamples")
+    parser.add_argument('--block', type=int, default=1, help="block length of a block bootstrap in samples")
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--engine', choices=list(FIT_ENGINES), default='ols',
+                        help="least squares, Huber or Theil-Sen robust, or inverse variance weighted fits")
+    args = parser.parse_args(argv)
+
+    try:
+        baseline = BaselineCorrection(args.baseline, args.reference)
+        bootstrap = BootstrapIntervals(args.bootstrap, args.confidence, args.block) if args.bootstrap else None
+        if bootstrap is not None and args.engine != 'ols':
+            raise ValueError("--bootstrap intervals are only computed for --engine ols")
+    except ValueError as error:
+        parser.error(str(error))
+    harmonic_check = [name if name in args.harmonics else False for name in HARMONIC_NAMES]
+    filenames = expand_filenames(args.paths, args.output, args.selections)
+    run_batch(filenames, load_selections(args.selections), harmonic_check, args.output, args.workers,
+              baseline=baseline, bootstrap=bootstrap, engine=args.engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""Benchmarks for the load, select, fit and export pipeline.
+
+Generates synthetic QCMD runs, times each stage separately with its peak
+traced memory and stores the results as json so runs from two commits can be
+compared:
+
+    python QCMDBenchmark.py --rows 10000 1000000 --output after.json --compare before.json
+    python QCMDBenchmark.py --startup
+    python QCMDBenchmark.py --legacy Book4.csv
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from QCMDAnalyser import QCMDDataReader
+from QCMDBaseline import BaselineCorrection
+from QCMDBootstrap import BootstrapIntervals
+from QCMDDataCache import QCMDDataCache
+from QCMDDataset import QUANTITIES, QCMDDataset
+from QCMDExcelReader import SENSOR_COLUMNS
+from QCMDExcelReader import QCMDDataReader as QCMDSensorReader
+from QCMDExport import export_results
+from QCMDFitting import empty_results, fit_checked, result_records
+from QCMDRobust import FIT_ENGINES
+from QCMDTimeIndex import TimeIndex
+
+HARMONIC_NAMES = ['F3', 'F5', 'F7', 'F9', 'F11', 'F13']
+
+
+class LegacyQCMDDataReader():
+    """The original row-by-row csv reader, kept as the benchmark baseline."""
+    def __init__(self, filename):
+        csvfile = open(filename, newline="")
+        reader = csv.reader(csvfile, delimiter=',')
+        self.time = list()
+        columns = [list() for col in range(12)]
+
+        for row in reader:
+            if len(row) > 0:
+                try:
+                    self.time.append(float(row[0]))
+                    for column, value in zip(columns, row[1:13]):
+                        column.append(float(value))
+                except ValueError:
+                    pass
+        csvfile.close()
+        self.harmonics = columns[:6]
+        self.dissapation = columns[6:]
+
+
+def benchmark_reader(reader_class, filename, repeat=5):
+    timer = timeit.Timer(lambda: reader_class(filename))
+    return min(timer.repeat(repeat=repeat, number=1))
+
+
+def benchmark_nearest(sizes=(10 ** 4, 10 ** 5, 10 ** 6), lookups=1000):
+    """Per-lookup cost in microseconds of the argmin scan and of TimeIndex."""
+    results = list()
+    for size in sizes:
+        time = np.linspace(0, 100, size)
+        points_t = np.column_stack((time))
+        index = TimeIndex(time)
+        values = np.random.RandomState(0).uniform(0, 100, lookups)
+        scan = timeit.timeit(lambda: [np.argmin((points_t - value) ** 2) for value in values], number=1)
+        search = timeit.timeit(lambda: [index.nearest(value) for value in values], number=1)
+        results.append((size, scan / lookups * 1e6, search / lookups * 1e6))
+    return results
+
+
+def synthetic_chunks(rows, columns, seed=0, chunk_size=100000):
+    """Drifting, noisy channels on a time axis in hours, like a real run, chunk_size rows at a time."""
+    random = np.random.RandomState(seed)
+    slopes = random.uniform(-2, 2, columns - 1)
+    offsets = random.uniform(-30, 30, columns - 1)
+    noise = 0.1 * np.arange(1, columns)
+    step = (rows / 1600.0 + 0.6) / max(rows - 1, 1)
+    for start in range(0, rows, chunk_size):
+        count = min(chunk_size, rows - start)
+        data = np.empty((count, columns))
+        data[:, 0] = -0.6 + np.arange(start, start + count) * step
+        data[:, 1:] = data[:, :1] * slopes + offsets + random.standard_normal((count, columns - 1)) * noise
+        yield data
+
+
+def synthetic_columns(rows, columns, seed=0):
+    return np.concatenate(list(synthetic_chunks(rows, columns, seed)))
+
+
+def generate_qcmd_file(filename, rows, chunk_size=100000):
+    """Writes an analyser export: two header rows then 13 comma separated columns."""
+    with open(filename, 'w', newline='') as csvfile:
+        csvfile.write('A,K,L,M,N,O,P,B,C,D,E,F,G\n')
+        csvfile.write('corrected time (hrs),F3 corr,F5 corr,F7 corr,F9 corr,F11 corr,F13 corr,'
+                      'D3 corr,d5 corr,d7 corr,d9 corr,d11 corr,d13 corr\n')
+        for data in synthetic_chunks(rows, QCMDDataReader.num_columns, chunk_size=chunk_size):
+            np.savetxt(csvfile, data, fmt='%.5f', delimiter=',')
+
+
+def generate_sensor_file(filename, rows, sensors, chunk_size=100000):
+    """Writes a tab delimited multi-sensor export with one column group per sensor."""
+    with open(filename, 'w', newline='') as txtfile:
+        txtfile.write('\t'.join(['Time'] + ['Value'] * (sensors * SENSOR_COLUMNS - 1)) + '\n')
+        chunks = [synthetic_chunks(rows, SENSOR_COLUMNS, seed, chunk_size) for seed in range(sensors)]
+        for group in zip(*chunks):
+            np.savetxt(txtfile, np.hstack(group), fmt='%.5f', delimiter='\t')
+
+
+def measure(stage, reset=None):
+    """Runs stage() twice, returning its result, wall time and peak traced memory.
+
+    The time comes from a run without tracemalloc, which slows down Python
+    heavy stages, and the peak from a second, traced run. reset() is called
+    before each run to undo what stage() leaves behind, such as a cache.
+    """
+    if reset is not None:
+        reset()
+    start = time.perf_counter()
+    result = stage()
+    elapsed = time.perf_counter() - start
+    if reset is not None:
+        reset()
+    tracemalloc.start()
+    stage()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {'seconds': elapsed, 'peak_bytes': peak}
+
+
+def remove_cache(filename):
+    cache = QCMDDataCache(filename)
+    for name in (cache.data_filename, cache.key_filename):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def benchmark_pipeline(directory, rows, sensors=2, harmonics=6, selections=20, lookups=1000):
+    """Times each pipeline stage on one synthetic run of the given size.
+
+    The analyser layout always has six harmonics, harmonics sets how many of
+    them are fitted.
+    """
+    filename = os.path.join(directory, 'run_{}.csv'.format(rows))
+    generate_qcmd_file(filename, rows)
+    stages = dict()
+
+    reader, stages['parse'] = measure(lambda: QCMDDataReader(filename), lambda: remove_cache(filename))
+    reader, stages['cached_open'] = measure(lambda: QCMDDataReader(filename))
+    data = np.array(reader.data, order='F')
+    reference = (data[0, 0], data[len(data) // 10, 0])
+    nothing, stages['baseline'] = measure(lambda: BaselineCorrection('drift', reference)(data))
+    dataset = QCMDDataset.from_reader(reader)
+
+    time_values = np.random.RandomState(1).uniform(dataset.time[0], dataset.time[-1], lookups)
+    index, stages['index_build'] = measure(lambda: TimeIndex(dataset.time))
+    nothing, stages['nearest_lookup'] = measure(lambda: [index.nearest(value) for value in time_values])
+    stages['nearest_lookup']['per_lookup_seconds'] = stages['nearest_lookup']['seconds'] / lookups
+
+    edges = np.linspace(dataset.time[0], dataset.time[-1], selections + 1)
+    harmonic_check = [name if number < harmonics else False for number, name in enumerate(HARMONIC_NAMES)]
+
+    def fit_all():
+        results = dict()
+        for quantity in QUANTITIES:
+            records = [empty_results()]
+            for number, (start_time, end_time) in enumerate(zip(edges[:-1], edges[1:]), 1):
+                start, end = dataset.window(start_time, end_time)
+                window_time, window = dataset.window_data(quantity, start, end)
+                names, fits = fit_checked(window_time, window, harmonic_check)
+                records.append(result_records(names, fits, number))
+            results[quantity] = np.concatenate(records)
+        return results
+    results, stages['fit'] = measure(fit_all)
+
+    #1000 resamples of the checked harmonics over a window of up to 10k samples
+    window_time, window = dataset.window_data('frequency', 0, min(rows, 10000))
+    bootstrap = BootstrapIntervals(1000, seed=0)
+    nothing, stages['bootstrap'] = measure(lambda: fit_checked(window_time, window, harmonic_check, bootstrap, 4))
+
+    #Every engine other than least squares over one selection spanning the whole run
+    run_time, run = dataset.window_data('frequency', 0, rows)
+    for engine, (label, fit) in FIT_ENGINES.items():
+        if engine != 'ols':
+            nothing, stages['fit_' + engine] = measure(lambda: fit_checked(run_time, run, harmonic_check, fit))
+
+    export_name = os.path.join(directory, 'results_{}.csv'.format(rows))
+    nothing, stages['export_csv'] = measure(lambda: export_results(export_name, results))
+
+    if sensors:
+        sensor_name = os.path.join(directory, 'sensors_{}.txt'.format(rows))
+        generate_sensor_file(sensor_name, rows, sensors)
+        nothing, stages['parse_sensors'] = measure(lambda: QCMDSensorReader(sensor_name, '\t'))
+
+    return {'rows': rows, 'sensors': sensors, 'harmonics': harmonics,
+            'selections': selections, 'stages': stages}
+
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from PyQt5 import QtWidgets
+app = QtWidgets.QApplication([])
+import QCMDAnalyser
+window = QCMDAnalyser.ApplicationWindow()
+window.show()
+shown = time.perf_counter() - start
+while window.freq_graph.graph is None:
+    if time.perf_counter() - start > {timeout}:
+        raise SystemExit("No graph after {timeout} seconds")
+    app.processEvents()
+print(shown, time.perf_counter() - start)
+"""
+
+
+def benchmark_startup(repeat=3, timeout=60):
+    """Seconds from launch to the shown window and to the first graph canvas.
+
+    Each run is a fresh process so no module is already imported, the
+    interpreter startup itself is left out. A run with no graph after
+    timeout seconds fails.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    environment = dict(os.environ)
+    environment.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    times = list()
+    for run in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT.format(timeout=timeout)],
+                                         cwd=directory, env=environment, timeout=2 * timeout)
+        times.append([float(value) for value in output.decode().split()[-2:]])
+    return tuple(min(column) for column in zip(*times))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(row_counts, sensors=2, harmonics=6, selections=20):
+    directory = tempfile.mkdtemp()
+    try:
+        #A small run first, so module imports and the first call of every stage are not timed
+        benchmark_pipeline(directory, 1000, sensors, harmonics, selections)
+        runs = [benchmark_pipeline(directory, rows, sensors, harmonics, selections) for rows in row_counts]
+    finally:
+        shutil.rmtree(directory)
+    return {'commit': git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'runs': runs}
+
+
+def compare(current, previous):
+    """Lines of current/previous time ratios for every matching run and stage."""
+    lines = list()
+    previous_runs = dict((run['rows'], run) for run in previous['runs'])
+    for run in current['runs']:
+        old = previous_runs.get(run['rows'])
+        if old is None:
+            continue
+        for stage, result in sorted(run['stages'].items()):
+            if stage in old['stages']:
+                ratio = result['seconds'] / max(old['stages'][stage]['seconds'], 1e-12)
+                lines.append("{:>9d} rows {:<15s} {:7.2f}x".format(run['rows'], stage, ratio))
+    return lines
+
+
+def print_suite(results):
+    for run in results['runs']:
+        print("{} rows".format(run['rows']))
+        for stage, result in sorted(run['stages'].items()):
+            print("  {:<15s} {:10.4f} s {:10.1f} MiB".format(stage, result['seconds'], result['peak_bytes'] / 2.0 ** 20))
+
+
+def print_legacy(filename):
+    legacy = benchmark_reader(LegacyQCMDDataReader, filename)
+    vectorized = benchmark_reader(lambda name: QCMDDataReader(name, use_cache=False), filename)
+    print("csv loop:   {:.4f} s".format(legacy))
+    print("vectorized: {:.4f} s".format(vectorized))
+    print("speedup:    {:.1f}x".format(legacy / vectorized))
+    print("")
+    print("nearest sample lookup (us per event)")
+    for size, scan, search in benchmark_nearest():
+        print("{:>9d} samples  argmin {:9.1f}  searchsorted {:6.1f}".format(size, scan, search))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the QCMD analysis pipeline.")
+    parser.add_argument('--rows', nargs='+', type=lambda value: int(float(value)), default=[10 ** 4, 10 ** 5])
+    parser.add_argument('--sensors', type=int, default=2)
+    parser.add_argument('--harmonics', type=int, default=6, choices=range(1, 7))
+    parser.add_argument('--selections', type=int, default=20)
+    parser.add_argument('--output', help="json file to store the results in")
+    parser.add_argument('--compare', help="json results of an earlier run")
+    parser.add_argument('--startup', action='store_true', help="time from launch to the first shown window")
+    parser.add_argument('--legacy', metavar='CSV', help="compare against the original reader on a real file")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        print("window shown: {:.3f} s  graph ready: {:.3f} s".format(*benchmark_startup()))
+        return
+
+    if args.legacy:
+        print_legacy(args.legacy)
+        return
+
+    results = run_suite(args.rows, args.sensors, args.harmonics, args.selections)
+    print_suite(results)
+    if args.output:
+        with open(args.output, 'w') as jsonfile:
+            json.dump(results, jsonfile, indent=2)
+    if args.compare:
+        with open(args.compare) as jsonfile:
+            print("")
+            print("\n".join(compare(results, json.load(jsonfile))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Bootstrap confidence intervals of the slope and intercept of line fits.
+
+A resample is held as the number of times each sample was drawn, so a batch
+of resamples is a (resamples, samples) weight matrix and every line of the
+batch comes from one matrix product with the few sums a line fit needs.
+With block longer than one, whole runs of block samples are drawn at a time
+(the moving block bootstrap), which keeps the correlation between
+neighbouring residuals of a drifting signal.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from QCMDProfiler import timed
+
+
+def resample_weights(random, samples, count, block=1):
+    """(count, samples) draw counts of count resamples of samples points."""
+    if block <= 1:
+        drawn = random.integers(0, samples, size=(count, samples))
+        drawn += np.arange(count)[:, np.newaxis] * samples
+        return np.bincount(drawn.ravel(), minlength=count * samples).reshape(count, samples).astype(np.float64)
+
+    block = min(block, samples)
+    starts = samples - block + 1
+    drawn = random.integers(0, starts, size=(count, -(-samples // block)))
+    #The last block is cut short so every resample still has samples points
+    last = samples - (drawn.shape[1] - 1) * block
+    whole = drawn if last == block else drawn[:, :-1]
+    whole = whole + np.arange(count)[:, np.newaxis] * starts
+    counts = np.bincount(whole.ravel(), minlength=count * starts).reshape(count, starts)
+    #A sample is covered by every block starting up to block - 1 samples before it
+    prefix = np.zeros((count, starts + 1))
+    np.cumsum(counts, axis=1, out=prefix[:, 1:])
+    index = np.arange(samples)
+    weights = prefix[:, np.minimum(index, starts - 1) + 1] - prefix[:, np.maximum(index - block + 1, 0)]
+    if last < block:
+        rows = np.arange(count)
+        edges = np.zeros((count, samples + 1))
+        edges[rows, drawn[:, -1]] += 1.0
+        edges[rows, drawn[:, -1] + last] -= 1.0
+        weights += np.cumsum(edges[:, :samples], axis=1)
+    return weights
+
+
+def bootstrap_lines(x, harmonics, resamples, block=1, seed=None, batch_size=1 << 22):
+    """Slopes and intercepts, each (resamples, columns), of resampled line fits."""
+    x = np.asarray(x, dtype=np.float64)
+    harmonics = np.asarray(harmonics, dtype=np.float64)
+    if harmonics.ndim == 1:
+        harmonics = harmonics[:, np.newaxis]
+    random = np.random.default_rng(seed)
+    samples, columns = harmonics.shape
+
+    #Centred so the weighted sums stay well conditioned
+    x_mean = x.mean()
+    y_mean = harmonics.mean(axis=0)
+    u = x - x_mean
+    v = harmonics - y_mean
+    terms = np.column_stack((np.ones(samples), u, u * u, v, u[:, np.newaxis] * v))
+
+    slopes = np.empty((resamples, columns))
+    intercepts = np.empty((resamples, columns))
+    batch = max(1, batch_size // max(samples, 1))
+    for first in range(0, resamples, batch):
+        count = min(batch, resamples - first)
+        sums = resample_weights(random, samples, count, block) @ terms
+        weight, su, suu = sums[:, 0:1], sums[:, 1:2], sums[:, 2:3]
+        sv, suv = sums[:, 3:3 + columns], sums[:, 3 + columns:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (weight * suv - su * sv) / (weight * suu - su * su)
+        slopes[first:first + count] = slope
+        intercepts[first:first + count] = (sv - slope * su) / weight + y_mean - slope * x_mean
+    return slopes, intercepts
+
+
+class BootstrapIntervals():
+    """Percentile intervals of slope and intercept from resamples line fits.
+
+    With workers above one the resamples are split over a process pool,
+    which is started on first use and kept for later fits.
+    """
+    def __init__(self, resamples=1000, confidence=0.95, block=1, workers=1, seed=None):
+        if resamples < 2:
+            raise ValueError("At least two resamples are needed")
+        if not 0 < confidence < 1:
+            raise ValueError("confidence must be between 0 and 1")
+        self.resamples = int(resamples)
+        self.confidence = float(confidence)
+        self.block = max(1, int(block))
+        self.workers = max(1, int(workers))
+        self.seed = seed
+        self.executor = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['executor'] = None
+        return state
+
+    def key(self):
+        """Identifies the settings, for caching intervals next to the fits."""
+        return ('bootstrap', self.resamples, self.confidence, self.block, self.seed)
+
+    @timed('bootstrap')
+    def __call__(self, x, harmonics):
+        """(columns, 4) array of slope low, slope high, intercept low and intercept high."""
+        slopes, intercepts = self.resample(x, harmonics)
+        tail = 50 * (1 - self.confidence)
+        slope_range = np.nanpercentile(slopes, [tail, 100 - tail], axis=0)
+        intercept_range = np.nanpercentile(intercepts, [tail, 100 - tail], axis=0)
+        return np.column_stack((slope_range[0], slope_range[1], intercept_range[0], intercept_range[1]))
+
+    def resample(self, x, harmonics):
+        if self.workers == 1:
+            return bootstrap_lines(x, harmonics, self.resamples, self.block, self.seed)
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        shares = [len(part) for part in np.array_split(np.arange(self.resamples), self.workers) if len(part)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(shares))
+        parts = list(self.executor.map(bootstrap_lines, [x] * len(shares), [harmonics] * len(shares),
+                                       shares, [self.block] * len(shares), seeds))
+        return np.concatenate([slopes for slopes, intercepts in parts]), \
+            np.concatenate([intercepts for slopes, intercepts in parts])
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class GrowableArray():
+    """Append-only float or index buffer that doubles its capacity when full.
+
+    Rows are stored column-major so each column of view() is contiguous.
+    Views are only valid until the next append that has to grow the buffer.
+    """
+    def __init__(self, columns=None, dtype=np.float64, capacity=1024):
+        self.columns = columns
+        self.dtype = dtype
+        self.size = 0
+        self.buffer = self.allocate(capacity)
+
+    def allocate(self, capacity):
+        if self.columns is None:
+            return np.empty(capacity, dtype=self.dtype)
+        return np.empty((capacity, self.columns), dtype=self.dtype, order='F')
+
+    def append(self, values):
+        values = np.asarray(values, dtype=self.dtype)
+        count = len(values)
+        if self.size + count > len(self.buffer):
+            capacity = len(self.buffer)
+            while capacity < self.size + count:
+                capacity *= 2
+            buffer = self.allocate(capacity)
+            buffer[:self.size] = self.buffer[:self.size]
+            self.buffer = buffer
+        self.buffer[self.size:self.size + count] = values
+        self.size += count
+
+    def truncate(self, size):
+        self.size = min(self.size, size)
+
+    def view(self):
+        return self.buffer[:self.size]
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+class QCMDDataCache():
+    """Sidecar binary cache for a parsed QCMD run.
+
+    The parsed array is stored next to the source file as a .npy file and
+    memory-mapped read-only on later opens. A small json key records the
+    size, mtime and a content hash of the source so that an edited file is
+    parsed again. Files larger than three sample blocks are hashed from
+    their first, middle and last block so that checking the key stays cheap.
+    """
+    version = 1
+    sample_size = 1 << 20
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.data_filename = filename + '.qcmd.npy'
+        self.key_filename = filename + '.qcmd.json'
+
+    def source_key(self):
+        stat = os.stat(self.filename)
+        return {'version': self.version,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'hash': self.content_hash(stat.st_size)}
+
+    def content_hash(self, size):
+        digest = hashlib.blake2b(digest_size=16)
+        with open(self.filename, 'rb') as source:
+            if size <= 3 * self.sample_size:
+                digest.update(source.read())
+            else:
+                for offset in (0, (size - self.sample_size) // 2, size - self.sample_size):
+                    source.seek(offset)
+                    digest.update(source.read(self.sample_size))
+        return digest.hexdigest()
+
+    def load(self, key):
+        try:
+            with open(self.key_filename) as keyfile:
+                if json.load(keyfile) != key:
+                    return None
+            return np.load(self.data_filename, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def save(self, data, key):
+        try:
+            #Drop the old key first so a half written cache is never trusted
+            if os.path.exists(self.key_filename):
+                os.remove(self.key_filename)
+            np.save(self.data_filename, data)
+            with open(self.key_filename, 'w') as keyfile:
+                json.dump(key, keyfile)
+        except OSError:
+            #Read only directory, carry on without a cache
+            pass
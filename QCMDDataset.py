@@ -0,0 +1,128 @@
+import itertools
+
+import numpy as np
+
+from QCMDDecimation import DecimationPyramid
+from QCMDDerived import derive
+from QCMDTimeIndex import TimeIndex
+
+QUANTITIES = ('frequency', 'dissipation')
+#Harmonic columns of a multi-sensor export that line up with the analyser's F3-F13 and D3-D13
+SENSOR_FREQUENCY = ('f3', 'f5', 'f7', 'f9', 'f11', 'f13')
+SENSOR_DISSIPATION = ('d3', 'd5', 'd7', 'd9', 'd11', 'd13')
+dataset_ids = itertools.count(1)
+
+
+class QCMDDataset():
+    """One loaded run, shared by the Frequency and Dissipation tabs.
+
+    Holds the time column and the per-harmonic column views handed out by the
+    reader, so both tabs point at the same memory. The time index and the
+    decimation pyramids are built the first time something asks for them.
+
+    A multi-sensor export loads as the dataset of its first sensor, with every
+    sensor, itself included, in sensors.
+
+    Any quantity other than frequency and dissipation is a derived channel,
+    computed from them on first use and dropped when the run grows.
+    """
+    def __init__(self, time, frequency, dissipation, label=None):
+        self.id = next(dataset_ids)
+        self.label = label
+        self.sensors = [self]
+        self.time = np.asarray(time)
+        self.channels = {'frequency': frequency, 'dissipation': dissipation}
+        self.derived = dict()
+        self.time_index = None
+        self.pyramids = dict()
+        self.windows = dict()
+
+    @classmethod
+    def from_reader(cls, reader):
+        if hasattr(reader, 'get_sensor_data'):
+            return cls.from_sensors(reader.get_sensor_data())
+        return cls(reader.get_time(), reader.get_harmonics(), reader.get_dissapation())
+
+    @classmethod
+    def from_sensors(cls, sensor_data):
+        if not sensor_data:
+            return cls(np.empty(0), [], [])
+        sensors = [cls(sensor.time, [getattr(sensor, name) for name in SENSOR_FREQUENCY],
+                       [getattr(sensor, name) for name in SENSOR_DISSIPATION], 'S' + str(number))
+                   for number, sensor in enumerate(sensor_data, 1)]
+        for sensor in sensors:
+            sensor.sensors = sensors
+        return sensors[0]
+
+    def get_time(self):
+        return self.time
+
+    def get_harmonics(self, quantity):
+        if quantity in self.channels:
+            return self.channels[quantity]
+        if quantity not in self.derived:
+            self.derived[quantity] = derive(quantity, self.channels['frequency'], self.channels['dissipation'])
+        return self.derived[quantity]
+
+    def get_time_index(self):
+        if self.time_index is None:
+            self.time_index = TimeIndex(self.time)
+        return self.time_index
+
+    def get_pyramids(self, quantity):
+        if quantity not in self.pyramids:
+            self.pyramids[quantity] = [DecimationPyramid(self.time, harmonic)
+                                       for harmonic in self.get_harmonics(quantity)]
+        return self.pyramids[quantity]
+
+    def window(self, start_time, end_time):
+        """Sample window start:end between the samples nearest the two times.
+
+        Lookups are remembered, so fitting the same selection for both
+        quantities only searches the time axis once.
+        """
+        key = (float(start_time), float(end_time))
+        if key not in self.windows:
+            start, end = self.get_time_index().nearest_many(key)
+            self.windows[key] = (int(start), int(end))
+        return self.windows[key]
+
+    def matching_window(self, other, start, end):
+        """Window of this sensor over the same times as samples start:end of other.
+
+        end is exclusive, so it is mapped through the time of the sample
+        after the window, and a window running to the end of other runs to
+        the end of this sensor.
+        """
+        last = len(other.time) - 1
+        start, matched_end = self.window(other.time[min(start, last)], other.time[min(end, last)])
+        return start, matched_end if end <= last else len(self.time)
+
+    def window_data(self, quantity, start, end):
+        return self.time[start:end], [np.asarray(harmonic)[start:end] for harmonic in self.get_harmonics(quantity)]
+
+    def extend(self, time, frequency, dissipation):
+        """Takes the grown columns of a followed file, earlier samples are unchanged."""
+        self.time = np.asarray(time)
+        self.channels = {'frequency': frequency, 'dissipation': dissipation}
+        self.derived = dict()
+        if self.time_index is not None:
+            self.time_index.extend(self.time)
+            self.windows = dict()
+        for quantity, pyramids in self.pyramids.items():
+            for pyramid, harmonic in zip(pyramids, self.get_harmonics(quantity)):
+                pyramid.extend(self.time, harmonic)
+
+
+class data_line():
+    """One selection, its samples and where they sit in the dataset."""
+    def __init__(self, xdata, harmonics,id):
+        self.xdata = xdata
+        self.ydata = harmonics
+        self.harmonics = harmonics
+        self.id = id
+        self.artist = None
+        self.label = None
+        self.idx_start = None
+        self.idx_end = None
+        self.channel = None
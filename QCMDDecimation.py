@@ -0,0 +1,85 @@
+import numpy as np
+
+from QCMDBuffer import GrowableArray
+
+
+class DecimationPyramid():
+    """Min/max envelopes of one channel at power-of-two bucket sizes.
+
+    Level k splits the samples into buckets of 2**(k + 1) and keeps the index
+    of the smallest and largest sample in each bucket, so drawing a level keeps
+    every peak of the raw trace. The pyramid is built once per dataset in O(n),
+    extend only rebuilds the buckets touched by newly appended samples, and
+    get_view picks the coarsest level that still gives about one bucket per
+    pixel of the visible x range.
+    """
+    def __init__(self, x, y):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.count = 0
+        self.monotonic = True
+        self.levels = list()
+        self.extend(x, y)
+
+    def extend(self, x, y):
+        """Takes the grown x and y arrays, of which the first count samples are unchanged."""
+        start = self.count
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.count = len(self.y)
+        if self.count == start:
+            return
+        if self.monotonic:
+            self.monotonic = bool(np.all(np.diff(self.x[max(start - 1, 0):]) >= 0))
+        if not self.monotonic:
+            self.levels = list()
+            return
+
+        first = start >> 1
+        imin = imax = np.arange(2 * first, self.count)
+        level = 0
+        while len(imin) > 0 and (level > 0 or self.count > 1):
+            if level == len(self.levels):
+                self.levels.append((GrowableArray(dtype=np.intp), GrowableArray(dtype=np.intp)))
+            level_min, level_max = self.levels[level]
+            level_min.truncate(first)
+            level_max.truncate(first)
+            level_min.append(self.reduce_pairs(imin, np.argmin))
+            level_max.append(self.reduce_pairs(imax, np.argmax))
+            if len(level_min) == 1:
+                break
+            #The next level only needs rebuilding from the parent of the first touched bucket
+            first >>= 1
+            imin = level_min.view()[2 * first:]
+            imax = level_max.view()[2 * first:]
+            level += 1
+        del self.levels[level + 1:]
+
+    def reduce_pairs(self, indices, pick):
+        if len(indices) % 2:
+            indices = np.append(indices, indices[-1])
+        pairs = indices.reshape(-1, 2)
+        choice = pick(self.y[pairs], axis=1)
+        return pairs[np.arange(len(pairs)), choice]
+
+    def get_view(self, xmin, xmax, pixels):
+        """Returns the x and y samples to draw between xmin and xmax."""
+        if not self.monotonic:
+            return self.x, self.y
+        start = max(np.searchsorted(self.x, xmin) - 1, 0)
+        end = min(np.searchsorted(self.x, xmax, side='right') + 1, len(self.x))
+        count = end - start
+        pixels = max(int(pixels), 1)
+        if count <= 2 * pixels:
+            return self.x[start:end], self.y[start:end]
+
+        level = 0
+        while level < len(self.levels) - 1 and count >> (level + 1) > pixels:
+            level += 1
+        imin, imax = (indices.view() for indices in self.levels[level])
+        first = start >> (level + 1)
+        last = ((end - 1) >> (level + 1)) + 1
+        buckets = np.sort(np.column_stack((imin[first:last], imax[first:last])), axis=1).ravel()
+        #Keep the exact end points so the trace reaches the edge of the view
+        indices = np.concatenate(([start], buckets[(buckets > start) & (buckets < end - 1)], [end - 1]))
+        return self.x[indices], self.y[indices]
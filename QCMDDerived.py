@@ -0,0 +1,53 @@
+"""Channels derived from the frequency and dissipation harmonics.
+
+Every channel is a list of one column per overtone, F3 to F13, like the raw
+quantities. A dataset computes a channel in one vectorized pass the first time
+it is asked for it and keeps it until its samples change.
+"""
+import numpy as np
+
+HARMONIC_NUMBERS = (3, 5, 7, 9, 11, 13)
+#Sauerbrey mass sensitivity of a 5 MHz AT-cut crystal, ng cm^-2 Hz^-1
+SAUERBREY_CONSTANT = 17.7
+
+
+def normalised_frequency(frequency, dissipation):
+    """Overtone normalised shift, delta f / n."""
+    return [np.asarray(harmonic) * (1.0 / number) for harmonic, number in zip(frequency, HARMONIC_NUMBERS)]
+
+
+def sauerbrey_mass(frequency, dissipation):
+    """Areal mass in ng/cm^2 of a rigid film, -C delta f / n."""
+    return [np.asarray(harmonic) * (-SAUERBREY_CONSTANT / number) for harmonic, number in zip(frequency, HARMONIC_NUMBERS)]
+
+
+def dissipation_ratio(frequency, dissipation):
+    """delta D / delta f of every overtone, NaN wherever delta f is zero."""
+    ratios = list()
+    for shift, harmonic in zip(frequency, dissipation):
+        shift = np.asarray(shift)
+        ratio = np.full(len(shift), np.nan)
+        np.divide(harmonic, shift, out=ratio, where=shift != 0)
+        ratios.append(ratio)
+    return ratios
+
+
+#Name: (label in the selection box, prefix of fit result ids, function of the raw quantities)
+DERIVED_CHANNELS = {
+    'normalised': ('Δf/n', 'df/n', normalised_frequency),
+    'mass': ('Sauerbrey mass (ng/cm²)', 'mass', sauerbrey_mass),
+    'ratio': ('ΔD/Δf', 'dD/df', dissipation_ratio),
+}
+
+#Channels each tab can plot and fit, its own quantity first
+TAB_CHANNELS = {
+    'frequency': ('frequency', 'normalised', 'mass'),
+    'dissipation': ('dissipation', 'ratio'),
+}
+
+CHANNEL_LABELS = dict([('frequency', 'Δf'), ('dissipation', 'ΔD')] +
+                      [(name, channel[0]) for name, channel in DERIVED_CHANNELS.items()])
+
+
+def derive(name, frequency, dissipation):
+    return DERIVED_CHANNELS[name][2](frequency, dissipation)
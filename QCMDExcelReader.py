@@ -1,82 +1,149 @@
-from openpyxl import load_workbook
-import unittest
 import csv
 import numpy as np
-class QCMDDataReader():
-    def __init__(self, filename, delimiter):
 
-        csvfile = open(filename, newline="")
-        reader = csv.reader(csvfile, delimiter=delimiter)
+from QCMDBaseline import BaselineCorrection
 
-        self.qcmd_data_list = list()
+#Column layout of one sensor in the export, drives both parsing and attribute access
+SENSOR_SCHEMA = ('time', 'f1', 'd1', 'f3', 'd3', 'f5', 'd5', 'f7', 'd7',
+                 'f9', 'd9', 'f11', 'd11', 'f13', 'd13')
+SENSOR_COLUMNS = len(SENSOR_SCHEMA)
+SENSOR_INDEX = dict((name, column) for column, name in enumerate(SENSOR_SCHEMA))
 
 
-        for row in reader:
-            if not self.qcmd_data_list:
-                self.num_sensors = int(len(row)/15)
-                for num in range(self.num_sensors):
-                   self.qcmd_data_list.append(QCMDSensorData())
-            if len(row) > 0:
-                sensors = [row[i:i + 15] for i in range(0, len(row), 15)]
-                for index, sensor in enumerate(sensors):
-                    try:
-                        self.save_qcmd_data(index,sensor)
-                    except ValueError:
-                        pass
-        self.normalise_qcmd_data()
+def is_sensor_export(filename, delimiter='\t'):
+    """True when the first line splits into whole groups of SENSOR_COLUMNS."""
+    with open(filename, newline="") as txtfile:
+        fields = txtfile.readline().rstrip('\r\n').split(delimiter)
+    return len(fields) >= SENSOR_COLUMNS and len(fields) % SENSOR_COLUMNS == 0
+
 
-    def save_qcmd_data(self, index, sensor):
-        qcmd_data = self.qcmd_data_list[index].get_values()
+class QCMDDataReader():
+    """Every sensor of a multi-sensor export, each zeroed by baseline.
+
+    The default baseline subtracts the first sample of each sensor.
+    """
+    def __init__(self, filename, delimiter, chunk_size=10000, baseline=None):
+        self.baseline = BaselineCorrection() if baseline is None else baseline
+        chunk_reader = QCMDChunkReader(filename, delimiter, chunk_size, normalise=False)
+        #Each sensor is filled in place as chunks arrive, sized by a first pass over the lines
+        rows = self.count_lines(filename)
+        sensors, filled = None, None
+        for chunk in chunk_reader:
+            if sensors is None:
+                sensors = [np.empty((rows, SENSOR_COLUMNS), order='F') for sensor in chunk]
+                filled = [0] * len(chunk)
+            for index, sensor in enumerate(chunk):
+                sensors[index][filled[index]:filled[index] + len(sensor)] = sensor
+                filled[index] += len(sensor)
+            #Release the parsed chunk before the next one is read
+            del chunk
+
+        self.num_sensors = chunk_reader.num_sensors
+        #Header and short rows were counted but never filled, the slices drop them without a copy
+        self.qcmd_data_list = [QCMDSensorData(data[:size]) for data, size in zip(sensors or [], filled or [])]
+        self.normalise_qcmd_data()
 
-        for data_list, value in zip(qcmd_data, sensor):
-            data_list.append(float(value))
+    def count_lines(self, filename):
+        with open(filename, newline="") as txtfile:
+            return sum(1 for line in txtfile if line.rstrip('\r\n'))
 
     def normalise_qcmd_data(self):
         for sensor in self.qcmd_data_list:
-            qcmd_data = sensor.get_values()[1:]
-            for data in qcmd_data:
-                zero = data[0]
-                data[:] = [x - zero for x in data]
+            sensor.data = self.baseline(sensor.data)
 
     def get_sensor_data(self):
         return self.qcmd_data_list
 
 
-class QCMDSensorData():
-    def __init__(self):
-        self.time = list()
-        self.f1 = list()
-        self.f3 = list()
-        self.f5 = list()
-        self.f7 = list()
-        self.f9 = list()
-        self.f11 = list()
-        self.f13 = list()
-
-        self.d1 = list()
-        self.d3 = list()
-        self.d5 = list()
-        self.d7 = list()
-        self.d9 = list()
-        self.d11 = list()
-        self.d13 = list()
+class QCMDChunkReader():
+    """Iterates over a multi-sensor export chunk_size rows at a time.
+
+    Each chunk is a list with one (rows, 15) float64 array per sensor. When
+    normalise is set every column but time is zeroed against the first valid
+    row of its sensor as the chunks are read.
+    """
+    def __init__(self, filename, delimiter, chunk_size=10000, normalise=True):
+        self.filename = filename
+        self.delimiter = delimiter
+        self.chunk_size = chunk_size
+        self.normalise = normalise
+        self.num_sensors = None
+        self.baselines = None
+
+    def __iter__(self):
+        self.num_sensors = None
+        self.baselines = None
+        with open(self.filename, newline="") as csvfile:
+            lines = list()
+            for line in csvfile:
+                line = line.rstrip('\r\n')
+                if not self.num_sensors:
+                    fields = next(csv.reader([line], delimiter=self.delimiter), [])
+                    self.num_sensors = int(len(fields) / SENSOR_COLUMNS)
+                if line:
+                    lines.append(line)
+                if len(lines) == self.chunk_size:
+                    yield self.parse_chunk(lines)
+                    lines = list()
+            if lines:
+                yield self.parse_chunk(lines)
+
+    def parse_chunk(self, lines):
+        if self.baselines is None:
+            self.baselines = [None] * self.num_sensors
+        columns = self.num_sensors * SENSOR_COLUMNS
+        try:
+            #Every line numeric, the whole chunk is parsed in C
+            data = np.loadtxt(lines, delimiter=self.delimiter, usecols=range(columns), ndmin=2)
+            sensors = [data[:, index * SENSOR_COLUMNS:(index + 1) * SENSOR_COLUMNS] for index in range(self.num_sensors)]
+        except (ValueError, IndexError):
+            rows = list(csv.reader(lines, delimiter=self.delimiter))
+            sensors = [self.parse_sensor([row[index * SENSOR_COLUMNS:(index + 1) * SENSOR_COLUMNS] for row in rows])
+                       for index in range(self.num_sensors)]
+        chunk = list()
+        for index, sensor in enumerate(sensors):
+            if self.normalise and len(sensor) > 0:
+                if self.baselines[index] is None:
+                    self.baselines[index] = sensor[0, 1:].copy()
+                sensor[:, 1:] -= self.baselines[index]
+            chunk.append(sensor)
+        return chunk
+
+    def parse_sensor(self, rows):
+        try:
+            return np.array(rows, dtype=np.float64).reshape(-1, SENSOR_COLUMNS)
+        except ValueError:
+            #Header or partial rows in this chunk, fall back to checking each row
+            valid = list()
+            for row in rows:
+                if len(row) == SENSOR_COLUMNS:
+                    try:
+                        valid.append([float(value) for value in row])
+                    except ValueError:
+                        pass
+            return np.array(valid, dtype=np.float64).reshape(-1, SENSOR_COLUMNS)
 
-    def get_values(self):
-        return [self.time, self.f1, self.d1, self.f3, self.d3, self.f5, self.d5, self.f7, self.d7,
-                    self.f9, self.d9, self.d11, self.f13, self.d13]
 
+class QCMDSensorData():
+    """One sensor's samples as a single (samples, 15) float64 array.
+
+    Columns follow SENSOR_SCHEMA and are read as attributes, so sensor.f11 is
+    a view of the f11 column.
+    """
+    __slots__ = ('data',)
 
-class TestQCMDDataReader(unittest.TestCase):
-    @classmethod
-    def setUpClass(self):
-        filename = 'E:\Chrome Download\Mannose 24-1-17.txt'
-        self.reader = QCMDDataReader(filename, '\t')
+    def __init__(self, data=None):
+        if data is None:
+            data = np.empty((0, SENSOR_COLUMNS), order='F')
+        self.data = data
 
-    def test_num_sensors(self):
-        self.assertEqual(self.reader.num_sensors, 2)
+    def __getattr__(self, name):
+        if name not in SENSOR_INDEX:
+            raise AttributeError(name)
+        return self.data[:, SENSOR_INDEX[name]]
 
-    def test_qcmd_data_list_size(self):
-        self.assertEqual(len(self.reader.qcmd_data_list),2)
+    def __len__(self):
+        return len(self.data)
 
-    #def test_get_time(self):
-     #   self.assertEqual(self.reader.get_time()[0], 0.34)
+    def get_values(self):
+        return [self.data[:, column] for column in range(SENSOR_COLUMNS)]
@@ -0,0 +1,75 @@
+"""Writers for fit results and the raw samples behind each selection.
+
+Results go to csv in the Export CSV layout (header, frequency rows, blank
+row, header, dissipation rows) or, for a .npz file name, to a compressed
+columnar archive that load_results reads straight back into arrays.
+"""
+import csv
+import os
+
+import numpy as np
+
+from QCMDDataset import QUANTITIES
+from QCMDFitting import RESULT_DTYPE, RESULT_HEADERS, format_value
+
+#Selection rows hold F3-F13 for frequency and D3-D13 for dissipation
+SELECTION_HEADERS = ['Quantity', 'Selection', 'Time', 'F3/D3', 'F5/D5', 'F7/D7', 'F9/D9', 'F11/D11', 'F13/D13']
+
+
+def export_results(filename, results, selections=None):
+    """results maps quantity to RESULT_DTYPE records, selections maps quantity to data_lines."""
+    if filename.lower().endswith('.npz'):
+        write_results_npz(filename, results, selections)
+    else:
+        write_results_csv(filename, results)
+        if selections:
+            root, extension = os.path.splitext(filename)
+            write_selections_csv(root + '_selections' + (extension or '.csv'), selections)
+
+
+def result_rows(records):
+    for record in records:
+        yield [str(record['id'])] + [format_value(record[field]) for field in RESULT_DTYPE.names[1:]]
+
+
+def write_results_csv(filename, results):
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',')
+        for number, quantity in enumerate(QUANTITIES):
+            if number:
+                writer.writerow([])
+            writer.writerow(RESULT_HEADERS)
+            writer.writerows(result_rows(results.get(quantity, ())))
+
+
+def selection_rows(quantity, selections):
+    for line in selections:
+        #One window at a time, so only a single selection is ever stacked in memory
+        block = np.column_stack([line.xdata] + list(line.harmonics))
+        for row in block:
+            yield [getattr(line, 'channel', None) or quantity, line.id] + [repr(float(value)) for value in row]
+
+
+def write_selections_csv(filename, selections):
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',')
+        writer.writerow(SELECTION_HEADERS)
+        for quantity in QUANTITIES:
+            writer.writerows(selection_rows(quantity, selections.get(quantity, ())))
+
+
+def write_results_npz(filename, results, selections=None):
+    arrays = dict()
+    for quantity in QUANTITIES:
+        arrays[quantity + '_results'] = np.asarray(results.get(quantity, ()), dtype=RESULT_DTYPE)
+        for line in (selections or {}).get(quantity, ()):
+            prefix = '{}_selection_{}_'.format(quantity, line.id)
+            arrays[prefix + 'time'] = np.asarray(line.xdata, dtype=np.float64)
+            arrays[prefix + 'harmonics'] = np.column_stack(line.harmonics)
+    np.savez_compressed(filename, **arrays)
+
+
+def load_results(filename):
+    """Reads a .npz export back into a dict of arrays without pickling."""
+    with np.load(filename, allow_pickle=False) as archive:
+        return dict((name, archive[name]) for name in archive.files)
@@ -0,0 +1,363 @@
+import threading
+from collections import OrderedDict
+from math import factorial
+
+import numpy as np
+
+from QCMDProfiler import timed
+
+RESULT_HEADERS = ['ID ', 'Slope', 'Intercept', 'R value', 'P value', 'K2 ', 'P val Error',
+                  'Slope CI low', 'Slope CI high', 'Intercept CI low', 'Intercept CI high']
+#Longest ID a record holds, batch IDs start with the full file name
+ID_LENGTH = 256
+#One record per fitted harmonic of a selection, in RESULT_HEADERS order
+RESULT_DTYPE = np.dtype([('id', 'U{}'.format(ID_LENGTH)), ('slope', np.float64), ('intercept', np.float64),
+                         ('r_value', np.float64), ('p_value', np.float64),
+                         ('k2', np.float64), ('p_norm_value', np.float64),
+                         ('slope_low', np.float64), ('slope_high', np.float64),
+                         ('intercept_low', np.float64), ('intercept_high', np.float64)])
+FIT_FIELDS = RESULT_DTYPE.names[1:7]
+INTERVAL_FIELDS = RESULT_DTYPE.names[7:]
+
+
+def fit_lines(x, harmonics):
+    """Least squares line fits of every column of harmonics against x.
+
+    harmonics is a (samples, columns) array. Returns a (columns, 6) array of
+    slope, intercept, r value, p value and the normaltest K2 and p value of
+    the residuals, matching stats.linregress and stats.normaltest run on each
+    column in turn.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    harmonics = np.asarray(harmonics, dtype=np.float64)
+    if harmonics.ndim == 1:
+        harmonics = harmonics[:, np.newaxis]
+    n = len(x)
+
+    x_mean = x.mean()
+    y_mean = harmonics.mean(axis=0)
+    dx = x - x_mean
+    dy = harmonics - y_mean
+    ssxm = dx.dot(dx)
+    ssxym = dx.dot(dy)
+    ssym = np.einsum('ij,ij->j', dy, dy)
+
+    slope = ssxym / ssxm
+    intercept = y_mean - slope * x_mean
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_value = np.where(ssym == 0, 0.0, ssxym / np.sqrt(ssxm * ssym))
+    r_value = np.clip(r_value, -1.0, 1.0)
+
+    p_value = correlation_p_value(r_value, n - 2)
+    #Residuals of every column at once, reusing the centred data
+    k2, p_norm_value = residual_normaltest(dy - np.outer(dx, slope))
+
+    return np.column_stack((slope, intercept, r_value, p_value, k2, p_norm_value))
+
+
+def correlation_p_value(r_value, df):
+    """Two sided p value of r with df degrees of freedom, as stats.linregress gives it."""
+    tiny = 1.0e-20
+    t = r_value * np.sqrt(df / ((1.0 - r_value + tiny) * (1.0 + r_value + tiny)))
+    #scipy.stats takes about a second to import, so it is left until the first fit
+    from scipy import stats
+    return 2 * stats.t.sf(np.abs(t), df)
+
+
+def residual_normaltest(residuals):
+    """normaltest K2 and p value of every column of residuals, which are centred in place."""
+    n = len(residuals)
+    residuals -= residuals.mean(axis=0)
+    squared = residuals * residuals
+    m2 = squared.mean(axis=0)
+    m3 = np.einsum('ij,ij->j', squared, residuals) / n
+    m4 = np.einsum('ij,ij->j', squared, squared) / n
+    return normaltest_from_moments(n, m2, m3, m4)
+
+
+def rolling_fit(x, harmonics, width, stride=1, segment=None):
+    """Line fits of every column of harmonics over windows sliding along x.
+
+    Windows are width samples long and start stride samples apart. Returns
+    the start index of each window and a (windows, columns, 6) array laid out
+    like fit_lines. Window sums are differences of cumulative sums, so the
+    cost does not grow with width. The sums restart every segment window
+    starts, on samples detrended by that segment's own line, which keeps the
+    third and fourth order residual sums from cancelling on long runs. The
+    default segment covers an eighth of a window or 256 samples, whichever is
+    longer, which holds K2 to within about 0.01 of fit_lines on real runs.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    harmonics = np.asarray(harmonics, dtype=np.float64)
+    if harmonics.ndim == 1:
+        harmonics = harmonics[:, np.newaxis]
+    n = len(x)
+    if width < 3 or width > n:
+        raise ValueError("window width must be between 3 and the number of samples")
+    if stride < 1:
+        raise ValueError("stride must be at least one sample")
+    starts = np.arange(0, n - width + 1, stride)
+    if segment is None:
+        #Curvature left over from a longer segment's line swamps the window residuals in the fourth powers
+        segment = max(max(width // 8, 256) // stride, 1)
+
+    fits = np.empty((len(starts), harmonics.shape[1], 6))
+    for first in range(0, len(starts), segment):
+        count = min(segment, len(starts) - first)
+        low = starts[first]
+        high = low + (count - 1) * stride + width
+        fits[first:first + count] = rolling_segment(x[low:high], harmonics[low:high], width, stride, count)
+    return starts, fits
+
+
+def rolling_segment(x, harmonics, width, stride, count):
+    #Non-finite samples, such as dD/df where df is zero, get weight 0 in every window sum
+    finite = np.isfinite(harmonics)
+    weights = None
+    if not finite.all():
+        weights = finite.astype(np.float64)
+        harmonics = np.where(finite, harmonics, 0.0)
+
+    #Residuals are unchanged by taking away a line, so fit what is left of this segment's own trend
+    x_mean = x.mean()
+    u = x - x_mean
+    if weights is None:
+        y_mean = harmonics.mean(axis=0)
+        uu = u.dot(u)
+        trend = u.dot(harmonics - y_mean) / uu if uu else np.zeros(harmonics.shape[1])
+    else:
+        y_mean = harmonics.sum(axis=0) / np.maximum(weights.sum(axis=0), 1.0)
+        uu = (u * u).dot(weights)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            trend = np.where(uu > 0, u.dot((harmonics - y_mean) * weights) / uu, 0.0)
+    v = harmonics - y_mean - np.outer(u, trend)
+    if weights is not None:
+        v *= weights
+
+    #sums[p, q] holds the window sums of u**p * v**q for p + q up to 4
+    end = (count - 1) * stride + 1
+    sums = dict()
+    u_powers = [None, u, u * u, u * u * u, (u * u) * (u * u)]
+    v_powers = [None, v, v * v, v * v * v, (v * v) * (v * v)]
+    for p in range(5):
+        for q in range(5 - p):
+            if p == 0 and q == 0:
+                if weights is None:
+                    continue
+                series = weights
+            elif q == 0:
+                series = u_powers[p][:, np.newaxis]
+                if weights is not None:
+                    series = series * weights
+            elif p == 0:
+                series = v_powers[q]
+            else:
+                series = u_powers[p][:, np.newaxis] * v_powers[q]
+            prefix = np.empty((len(series) + 1, series.shape[1]))
+            prefix[0] = 0.0
+            np.cumsum(series, axis=0, out=prefix[1:])
+            sums[p, q] = prefix[width:width + end:stride] - prefix[:end:stride]
+    if weights is None:
+        sums[0, 0] = float(width)
+
+    #The number of finite samples of every window and column when some are left out
+    samples = sums[0, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u_bar = sums[1, 0] / samples
+        v_bar = sums[0, 1] / samples
+    sxx = sums[2, 0] - samples * u_bar * u_bar
+    sxy = sums[1, 1] - samples * u_bar * v_bar
+    syy = sums[0, 2] - samples * v_bar * v_bar
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope_v = np.where(sxx == 0, 0.0, sxy / sxx)
+    intercept_v = v_bar - slope_v * u_bar
+
+    slope = slope_v + trend
+    intercept = intercept_v + y_mean - slope * x_mean
+    #r of the original samples, adding the segment trend back into the sums of squares
+    sxy_y = sxy + trend * sxx
+    syy_y = syy + 2 * trend * sxy + trend * trend * sxx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_value = np.where(syy_y <= 0, 0.0, sxy_y / np.sqrt(sxx * syy_y))
+    r_value = np.clip(r_value, -1.0, 1.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_value = correlation_p_value(r_value, samples - 2)
+
+    #Power sums of the residuals v - intercept_v - slope_v * u, expanded with the multinomial theorem
+    a_powers = [1.0, -intercept_v]
+    b_powers = [1.0, -slope_v]
+    for power in range(2, 5):
+        a_powers.append(a_powers[-1] * a_powers[1])
+        b_powers.append(b_powers[-1] * b_powers[1])
+    moments = list()
+    for power in (2, 3, 4):
+        total = 0.0
+        for c in range(power + 1):
+            for b in range(power + 1 - c):
+                a = power - b - c
+                coefficient = factorial(power) // (factorial(a) * factorial(b) * factorial(c))
+                total = total + coefficient * (a_powers[b] * b_powers[c]) * sums[c, a]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            moments.append(total / samples)
+    k2, p_norm_value = normaltest_from_moments(samples, *moments)
+
+    return np.stack((slope, intercept, r_value, p_value, k2, p_norm_value), axis=-1)
+
+
+def fit_finite(xdata, harmonics, fit=fit_lines, fields=6):
+    """fit of every column of harmonics over its finite samples only.
+
+    Columns with NaN or infinite samples, such as dD/df where df is zero, are
+    fitted one at a time without them, the rest together as usual. A column
+    with fewer than three finite samples gets NaN.
+    """
+    finite = np.isfinite(harmonics)
+    if finite.all():
+        return fit(xdata, harmonics)
+    xdata = np.asarray(xdata, dtype=np.float64)
+    complete = finite.all(axis=0)
+    fits = np.full((harmonics.shape[1], fields), np.nan)
+    if complete.any():
+        fits[complete] = fit(xdata, harmonics[:, complete])
+    for column in np.flatnonzero(~complete):
+        rows = finite[:, column]
+        if np.count_nonzero(rows) >= 3:
+            fits[column] = fit(xdata[rows], harmonics[rows, column:column + 1])[0]
+    return fits
+
+
+@timed('fit')
+def fit_checked(xdata, harmonics, harmonic_check, fit=fit_lines, fields=6):
+    """Names of the checked harmonics and fit of them, fit_lines unless given another.
+
+    fit takes x and a (samples, columns) array and returns fields values per column.
+    """
+    checked = [(check, harmonic) for harmonic, check in zip(harmonics, harmonic_check) if check]
+    if not checked:
+        return list(), np.empty((0, fields))
+    fits = fit_finite(xdata, np.column_stack([harmonic for check, harmonic in checked]), fit, fields)
+    return [check for check, harmonic in checked], fits
+
+
+def result_records(names, fits, selection_id, intervals=None):
+    """Records of fits, with confidence intervals when given and NaN otherwise."""
+    ids = [name + " " + str(selection_id) for name in names]
+    for record_id in ids:
+        if len(record_id) > ID_LENGTH:
+            raise ValueError("Result ID is longer than {} characters: {}".format(ID_LENGTH, record_id))
+    records = np.empty(len(names), dtype=RESULT_DTYPE)
+    records['id'] = ids
+    for column, field in enumerate(FIT_FIELDS):
+        records[field] = fits[:, column]
+    for column, field in enumerate(INTERVAL_FIELDS):
+        records[field] = np.nan if intervals is None else intervals[:, column]
+    return records
+
+
+def empty_results():
+    return np.empty(0, dtype=RESULT_DTYPE)
+
+
+def format_value(value):
+    #Missing values, such as intervals that were not computed, are left blank
+    if np.isnan(value):
+        return ''
+    return str(round(float(value), 3))
+
+
+def format_records(records):
+    rows = list()
+    for record in records:
+        rows.append([str(record[0])] + [format_value(value) for value in list(record)[1:]])
+    return rows
+
+
+class FitResultCache():
+    """LRU cache of fit results keyed on (dataset id, start, end, harmonic, quantity).
+
+    Safe to use from the fitting worker while the GUI thread clears it.
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def fit_window(self, dataset_id, start, end, quantity, xdata, harmonics, harmonic_check,
+                   fit=fit_lines, fields=6, tag=None):
+        """Fits of the checked harmonics over samples start:end, only refitting cache misses.
+
+        fit and fields are as in fit_checked, results of any fit but fit_lines
+        are told apart by tag. Returns the checked harmonic names and a
+        (names, fields) array of results.
+        """
+        names = [check for check in harmonic_check if check]
+        keys = [(dataset_id, start, end, name, quantity) + (() if tag is None else (tag,)) for name in names]
+        fits = np.empty((len(names), fields))
+        missing = list()
+        with self.lock:
+            for row, key in enumerate(keys):
+                if key in self.results:
+                    self.results.move_to_end(key)
+                    fits[row] = self.results[key]
+                else:
+                    missing.append(row)
+
+        if missing:
+            checked = [harmonic for harmonic, check in zip(harmonics, harmonic_check) if check]
+            fits[missing] = fit_finite(xdata, np.column_stack([checked[row] for row in missing]), fit, fields)
+            with self.lock:
+                for row in missing:
+                    self.results[keys[row]] = fits[row].copy()
+                while len(self.results) > self.maxsize:
+                    self.results.popitem(last=False)
+        return names, fits
+
+    def discard_window(self, dataset_id, start, end):
+        with self.lock:
+            for key in [key for key in self.results if key[:3] == (dataset_id, start, end)]:
+                del self.results[key]
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def __len__(self):
+        return len(self.results)
+
+
+def normaltest_from_moments(n, m2, m3, m4):
+    """D'Agostino and Pearson's K2 test from central moments.
+
+    Same statistic as stats.normaltest, but takes the second to fourth
+    central moments so callers can build them for many samples at once.
+    """
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        skewness = np.where(m2 == 0, 0.0, m3 / m2 ** 1.5)
+        kurtosis = np.where(m2 == 0, 3.0, m4 / m2 ** 2)
+
+        #Skewness test
+        y = skewness * np.sqrt(((n + 1) * (n + 3)) / (6.0 * (n - 2)))
+        beta2 = (3.0 * (n ** 2 + 27 * n - 70) * (n + 1) * (n + 3) /
+                 ((n - 2.0) * (n + 5) * (n + 7) * (n + 9)))
+        w2 = -1 + np.sqrt(2 * (beta2 - 1))
+        delta = 1 / np.sqrt(0.5 * np.log(w2))
+        alpha = np.sqrt(2.0 / (w2 - 1))
+        y = np.where(y == 0, 1.0, y)
+        z_skew = delta * np.log(y / alpha + np.sqrt((y / alpha) ** 2 + 1))
+
+        #Kurtosis test
+        expected = 3.0 * (n - 1) / (n + 1)
+        variance = 24.0 * n * (n - 2) * (n - 3) / ((n + 1) * (n + 1.0) * (n + 3) * (n + 5))
+        x = (kurtosis - expected) / np.sqrt(variance)
+        sqrt_beta1 = 6.0 * (n * n - 5 * n + 2) / ((n + 7) * (n + 9)) * \
+                     np.sqrt((6.0 * (n + 3) * (n + 5)) / (n * (n - 2) * (n - 3)))
+        a = 6.0 + 8.0 / sqrt_beta1 * (2.0 / sqrt_beta1 + np.sqrt(1 + 4.0 / (sqrt_beta1 ** 2)))
+        term1 = 1 - 2 / (9.0 * a)
+        denom = 1 + x * np.sqrt(2 / (a - 4.0))
+        term2 = np.sign(denom) * np.where(denom == 0.0, np.nan, ((1 - 2.0 / a) / np.abs(denom)) ** (1 / 3.0))
+        z_kurt = (term1 - term2) / np.sqrt(2 / (9.0 * a))
+
+    k2 = z_skew ** 2 + z_kurt ** 2
+    return k2, np.exp(-k2 / 2)
@@ -0,0 +1,480 @@
+"""Matplotlib canvases of the analyser.
+
+Kept out of QCMDAnalyser so matplotlib is only imported once the first graph
+tab is shown, after the main window is already up.
+"""
+import matplotlib
+# Make sure that we are using QT5
+matplotlib.use('Qt5Agg')
+from PyQt5 import QtCore, QtWidgets, QtGui
+
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+import numpy as np
+
+from QCMDDataset import data_line
+from QCMDDecimation import DecimationPyramid
+from QCMDFitting import rolling_fit
+from QCMDProfiler import timed
+from QCMDSegmentation import linear_regions
+
+
+class MyMplCanvas(FigureCanvas):
+    """Ultimately, this is a QWidget (as well as a FigureCanvasAgg, etc.)."""
+
+    def __init__(self, parent=None, width=5, height=4, dpi=100):
+        self.press = None
+        self.prevX = 0
+        self.ydata = list()
+        self.xdata = list()
+        fig = Figure(figsize=(width, height), dpi=dpi)
+
+        self.axes = fig.add_subplot(111)
+
+        #self.compute_initial_figure()
+
+        #
+        FigureCanvas.__init__(self, fig)
+        self.setParent(parent)
+
+        FigureCanvas.setSizePolicy(self,
+                                   QtWidgets.QSizePolicy.Expanding,
+                                   QtWidgets.QSizePolicy.Expanding)
+        FigureCanvas.updateGeometry(self)
+        FigureCanvas.mpl_connect(self,'button_press_event', self.onclick)
+        FigureCanvas.mpl_connect(self, 'button_release_event', self.onrelease)
+        FigureCanvas.mpl_connect(self, 'motion_notify_event', self.onmove)
+        FigureCanvas.mpl_connect(self, 'scroll_event', self.zoom)
+        FigureCanvas.mpl_connect(self, 'pick_event', self.onpick)
+        FigureCanvas.mpl_connect(self, 'figure_enter_event', self.on_enter)
+        FigureCanvas.mpl_connect(self, 'figure_leave_event', self.on_exit)
+
+    def compute_initial_figure(self):
+        pass
+
+    @timed('draw')
+    def draw(self):
+        FigureCanvas.draw(self)
+
+    def onclick(self,event):
+        pass
+
+    def onpick(self,event):
+        pass
+
+    def onmove(self,event):
+        pass
+
+    def onrelease(self, event):
+        pass
+
+    def scroll(self,event):
+        pass
+
+    def on_enter(self,event):
+        pass
+
+    def on_exit(self,event):
+        pass
+
+
+class QCMDDataPlotter(MyMplCanvas):
+    """Simple canvas with a sine plot."""
+    def __init__(self,  *args, **kwargs):
+        MyMplCanvas.__init__(self, *args, **kwargs)
+
+        self.data_line_list = list()
+        self.data_line_num = 0
+        self.text_list= list()
+
+        self.dataset = None
+        self.quantity = None
+        self.harmonics = []
+        self.harmonic_lines = list()
+        self.selection_artist = None
+        self.background = None
+        self.fit_cache = None
+        self.dataset_id = None
+        #Called with no arguments when a selection is drawn, proposed or deleted here
+        self.selections_changed = None
+        self.overline = False
+        self.active = True
+        self.rolling = None
+        self.rolling_axes = None
+        self.rolling_lines = list()
+        FigureCanvas.mpl_connect(self, 'resize_event', self.on_resize)
+
+    @timed('compute_initial_figure')
+    def compute_initial_figure(self, dataset, quantity, check_values):
+        self.dataset = dataset
+        self.quantity = quantity
+        self.check_values = check_values
+        self.dataset_id = dataset.id
+        self.set_dataset_arrays()
+
+        self.plot_harmonics()
+        self.plt[0].set_picker(1)
+
+        self.default_xlim = self.axes.get_xlim()
+        self.default_ylim = self.axes.get_ylim()
+        self.prev_xlim = self.default_xlim
+
+
+        self.draw()
+
+
+
+    #Used to update the displayed harmonics when graph has been created
+    @timed('redraw_harmonics')
+    def redraw_harmonics(self, check_values):
+        self.check_values = check_values
+        for (line, pyramid), plot_harmonic in zip(self.harmonic_lines, check_values):
+            line.set_visible(bool(plot_harmonic))
+        self.axes.relim(visible_only=True)
+        self.axes.autoscale_view()
+        if self.rolling is not None:
+            self.plot_rolling(*self.rolling)
+        self.refresh_lod()
+        self.draw()
+
+    #One persistent line per harmonic, redraws only toggle visibility and swap data
+    def plot_harmonics(self):
+        self.harmonic_lines = list()
+        for plot_harmonic, pyramid in zip(self.check_values, self.pyramids):
+            x, y = pyramid.get_view(self.x_array[0], self.x_array[-1], self.pixel_width())
+            line = self.axes.plot(x, y, visible=bool(plot_harmonic))
+            self.harmonic_lines.append((line[0], pyramid))
+            if plot_harmonic:
+                self.plt = line
+        self.axes.relim(visible_only=True)
+        self.axes.autoscale_view()
+
+    #Swap in the decimation level that matches the current x limits
+    def refresh_lod(self):
+        xmin, xmax = self.axes.get_xlim()
+        for line, pyramid in self.harmonic_lines + self.rolling_lines:
+            if line.get_visible():
+                line.set_data(*pyramid.get_view(xmin, xmax, self.pixel_width()))
+
+    def pixel_width(self):
+        return self.axes.bbox.width
+
+    #Everything here is shared with the other tab through the dataset, nothing is copied
+    def set_dataset_arrays(self):
+        self.x_array = self.dataset.get_time()
+        self.time = self.x_array
+        self.harmonics = self.dataset.get_harmonics(self.quantity)
+        self.f_array = np.asarray(self.harmonics[0])
+        self.time_index = self.dataset.get_time_index()
+        #The plotted lines only ever hold decimated samples
+        self.pyramids = self.dataset.get_pyramids(self.quantity)
+
+    #Called once the dataset of a followed file has grown, extends the existing lines
+    def append_samples(self):
+        last_time = self.x_array[-1]
+        start = len(self.x_array)
+        self.set_dataset_arrays()
+        harmonics = self.harmonics
+
+        new_values = [np.asarray(harmonic)[start:] for harmonic, check in zip(harmonics, self.check_values) if check]
+        if new_values:
+            ymin = min(self.default_ylim[0], min(values.min() for values in new_values))
+            ymax = max(self.default_ylim[1], max(values.max() for values in new_values))
+            self.default_ylim = (ymin, ymax)
+        self.default_xlim = (self.default_xlim[0], max(self.default_xlim[1], self.x_array[-1]))
+
+        #Keep scrolling with the run while the newest samples are in view
+        xmin, xmax = self.axes.get_xlim()
+        if xmax >= last_time:
+            self.axes.set_xlim(xmin, max(xmax, self.x_array[-1]))
+            ylim = self.axes.get_ylim()
+            if new_values:
+                self.axes.set_ylim(min(ylim[0], ymin), max(ylim[1], ymax))
+        if self.rolling is not None:
+            self.plot_rolling(*self.rolling)
+        self.refresh_lod()
+        self.draw_idle()
+
+    #Rolling slope of each shown harmonic on a second y axis, kept behind the main
+    #axes so mouse events and their y data still belong to the harmonics
+    @timed('plot_rolling')
+    def plot_rolling(self, width, stride):
+        self.clear_rolling()
+        self.rolling = (width, stride)
+        shown = [(line, harmonic) for (line, pyramid), harmonic, check
+                 in zip(self.harmonic_lines, self.harmonics, self.check_values) if check]
+        if not shown or width > len(self.x_array):
+            return
+        starts, fits = rolling_fit(self.x_array, np.column_stack([harmonic for line, harmonic in shown]),
+                                   width, stride)
+        centres = self.x_array[starts + width // 2]
+        self.rolling_axes = self.axes.twinx()
+        self.rolling_axes.set_zorder(self.axes.get_zorder() - 1)
+        self.axes.patch.set_visible(False)
+        self.rolling_axes.set_ylabel('Rolling slope')
+        xmin, xmax = self.axes.get_xlim()
+        for column, (line, harmonic) in enumerate(shown):
+            pyramid = DecimationPyramid(centres, np.ascontiguousarray(fits[:, column, 0]))
+            rolling_line, = self.rolling_axes.plot(*pyramid.get_view(xmin, xmax, self.pixel_width()),
+                                                   linestyle='--', color=line.get_color(), alpha=0.6)
+            self.rolling_lines.append((rolling_line, pyramid))
+
+    def clear_rolling(self):
+        if self.rolling_axes is not None:
+            self.rolling_axes.remove()
+            self.axes.patch.set_visible(True)
+        self.rolling_axes = None
+        self.rolling_lines = list()
+
+    def hide_rolling(self):
+        self.clear_rolling()
+        self.rolling = None
+
+    #Proposed windows become ordinary selections, fitted and deleted like drawn ones
+    def propose_selections(self, **options):
+        columns = [harmonic for harmonic, check in zip(self.harmonics, self.check_values) if check]
+        if not columns:
+            return []
+        #Windows that are already selections, from an earlier run for example, are not added again
+        existing = set(self.selection_windows())
+        proposed = list()
+        for start, end in linear_regions(self.x_array, np.column_stack(columns), **options):
+            if (start, end) in existing:
+                continue
+            self.data_line_num += 1
+            proposed.append(self.add_window_selection(start, end, self.data_line_num))
+        self.draw()
+        if proposed:
+            self.notify_selections()
+        return proposed
+
+    def add_window_selection(self, start, end, line_id):
+        x, y = self.pyramids[0].get_view(self.x_array[start], self.x_array[end - 1], self.pixel_width())
+        line = data_line(list(x), list(y), line_id)
+        line.idx_start, line.idx_end = start, end
+        self.add_selection_artists(line)
+        self.data_line_list.append(line)
+        return line
+
+    def selection_windows(self):
+        """(start, end) sample window of every selection, in selection order."""
+        for line in self.data_line_list:
+            if line.idx_start is None:
+                line.idx_start, line.idx_end = self.dataset.window(line.xdata[0], line.xdata[-1])
+        return [(line.idx_start, line.idx_end) for line in self.data_line_list]
+
+    def set_selection_windows(self, windows):
+        """Replaces the selections with windows, numbered from 1."""
+        for line in self.data_line_list:
+            line.artist.remove()
+            line.label.remove()
+        self.data_line_list = list()
+        for line_id, (start, end) in enumerate(windows, 1):
+            self.add_window_selection(start, end, line_id)
+        self.data_line_num = len(windows)
+        self.draw()
+
+    def notify_selections(self):
+        if self.selections_changed is not None:
+            self.selections_changed()
+
+    #The selections are kept as sample windows and drawn again on the new channel
+    def set_channel(self, quantity):
+        windows = self.selection_windows()
+        self.clear_figure()
+        self.compute_initial_figure(self.dataset, quantity, self.check_values)
+        self.set_selection_windows(windows)
+
+    def on_resize(self, event):
+        self.refresh_lod()
+
+    def clear_figure(self):
+        self.clear_rolling()
+        self.axes.cla()
+        self.harmonic_lines = list()
+        self.data_line_list= list()
+        self.selection_artist = None
+        self.background = None
+
+        self.data_line_num = 0
+        self.text_list = list()
+
+
+    def onclick(self, event):
+        if self.active:
+            self.del_line = False
+            if event.dblclick:
+                self.del_line = True
+            if not self.del_line:
+                QtCore.QTimer.singleShot(500, lambda: self.check_double_click(event))
+
+    def zoom(self,event):
+        # get the current x and y limits
+        base_scale = 1.01
+        cur_xlim = self.axes.get_xlim()
+        cur_ylim = self.axes.get_ylim()
+
+        if event.button == 'up':
+            # deal with zoom in
+            self.axes.set_xlim([cur_xlim[0] + base_scale,
+                                cur_xlim[1] - base_scale])
+            self.axes.set_ylim([cur_ylim[0] + base_scale,
+                                cur_ylim[1] - base_scale])
+        elif event.button == 'down':
+            # deal with zoom out
+            self.axes.set_xlim([cur_xlim[0] - base_scale,
+                                cur_xlim[1] + base_scale])
+            self.axes.set_ylim([cur_ylim[0] - base_scale,
+                                cur_ylim[1] + base_scale])
+        else:
+            # deal with something that should never happen
+            scale_factor = 1
+
+            event.button
+        # set new limits
+        self.refresh_lod()
+        self.draw()  # force re-draw
+
+    def reset_zoom(self):
+        self.axes.set_xlim([self.default_xlim[0],self.default_xlim[1]])
+
+        self.axes.set_ylim([self.default_ylim[0],self.default_ylim[1]])
+        self.refresh_lod()
+        self.draw()
+
+
+    def check_double_click(self, event):
+        if self.del_line:
+            self.delete_line(event)
+        else:
+            if self.overline:
+                self.press = True
+                self.initialx = event.xdata
+                self.prevX = 0
+                self.data_line_num += 1
+                self.start_selection()
+            else:
+                self.press = False
+                self.cur_xlim = self.axes.get_xlim()
+                self.cur_ylim = self.axes.get_ylim()
+                self.xpress = event.xdata
+                self.ypress = event.ydata
+                self.setCursor(QtGui.QCursor(QtCore.Qt.ClosedHandCursor))
+
+    #The in-progress selection is animated, so it is left out of the cached background
+    def start_selection(self):
+        self.selection_artist, = self.axes.plot([], [], 'r', linewidth=6.0, alpha=0.7, animated=True)
+        self.draw()
+        self.background = self.copy_from_bbox(self.axes.bbox)
+
+    def add_selection_artists(self, line):
+        line.artist, = self.axes.plot(line.xdata, line.ydata, 'r', linewidth=6.0, alpha=0.7, gid=line.id)
+        line.label = self.axes.text(line.xdata[0], line.ydata[0], str(line.id))
+
+    def delete_line(self,event):
+        for line in self.data_line_list:
+            if line.artist.contains(event)[0]:
+                if self.fit_cache is not None and line.idx_start is not None:
+                    #Every sensor was fitted over its own matching window
+                    for sensor in self.dataset.sensors:
+                        start, end = line.idx_start, line.idx_end
+                        if sensor is not self.dataset:
+                            start, end = sensor.matching_window(self.dataset, start, end)
+                        self.fit_cache.discard_window(sensor.id, start, end)
+                line.artist.remove()
+                line.label.remove()
+                self.data_line_list.remove(line)
+                self.data_line_num -= 1
+                for line_num, remaining in enumerate(self.data_line_list, 1):
+                    remaining.id = line_num
+                    remaining.artist.set_gid(line_num)
+                    remaining.label.set_text(str(line_num))
+                self.draw()
+                self.notify_selections()
+                return
+
+        self.draw()
+
+    @timed('onmove')
+    def onmove(self, event):
+        try:
+            if self.press is not None:
+                if self.press:
+                    if event.x > self.prevX:
+
+
+                        idx = self.time_index.nearest(event.xdata)
+
+                        self.xdata.append(self.x_array[idx])
+                        self.ydata.append(self.f_array[idx])
+                        self.update_graph(event)
+                    elif self.initialx < event.x < self.prevX:
+                        try:
+                            self.xdata.pop()
+                            self.ydata.pop()
+                        except IndexError:
+                            return
+                        self.update_graph(event)
+                else:
+
+                    dx = event.xdata - self.xpress
+                    dy = event.ydata - self.ypress
+                    self.cur_xlim -= dx
+                    self.cur_ylim -= dy
+                    if self.cur_xlim[1] > self.default_xlim[1] or self.cur_xlim[0] < self.default_xlim[0] or \
+                                    self.cur_ylim[1]> (self.default_ylim[1] +10) or self.cur_ylim[0]< (self.default_ylim[0] - 10):
+                        pass
+                    else:
+                        self.axes.set_xlim(self.cur_xlim)
+                        self.axes.set_ylim(self.cur_ylim)
+                        self.prev_xlim = self.cur_xlim
+                        self.refresh_lod()
+                    self.draw()
+
+            else:
+                for curve in self.axes.get_lines():
+                    if curve.get_visible() and curve.contains(event)[0]:
+                        self.setCursor(QtGui.QCursor(QtCore.Qt.IBeamCursor))
+                        self.overline = True
+                        break
+                    else:
+                        self.setCursor(QtGui.QCursor(QtCore.Qt.ArrowCursor))
+                        self.overline =False
+
+        except TypeError:
+            pass
+
+    def onrelease(self, event):
+        if self.press:
+            self.selection_artist.remove()
+            self.selection_artist = None
+            self.background = None
+
+            added = len(self.xdata) > 0
+            if added:
+                line = data_line(self.xdata[:], self.ydata[:], self.data_line_num)
+                self.add_selection_artists(line)
+                self.data_line_list.append(line)
+            else:
+                self.data_line_num -= 1
+            del self.xdata[:]
+            del self.ydata[:]
+            self.draw()
+            if added:
+                self.notify_selections()
+        self.press = None
+
+    #Only the selection being dragged is redrawn, everything else comes from the cached background
+    @timed('update_graph')
+    def update_graph(self, event):
+        self.selection_artist.set_data(self.xdata, self.ydata)
+        self.restore_region(self.background)
+        self.axes.draw_artist(self.selection_artist)
+        self.blit(self.axes.bbox)
+        self.prevX = event.x
+
+    def on_enter(self,event):
+        self.active = True
+
+    def on_exit(self,event):
+        self.active = False
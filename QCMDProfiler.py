@@ -0,0 +1,129 @@
+"""Per-stage timings for the analyser.
+
+Functions wrapped with timed(name) are recorded by the shared profiler while it
+is enabled. When disabled a wrapped call costs one attribute check. Set the
+QCMD_PROFILE environment variable to record from startup, and dump a trace to
+load in chrome://tracing or Perfetto.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class StageStats():
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        if duration > self.max:
+            self.max = duration
+
+
+class Profiler():
+    """Counts and durations per stage plus a bounded list of trace events."""
+    def __init__(self, enabled=False, max_events=100000):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.stages = dict()
+        self.events = deque(maxlen=max_events)
+        self.origin = time.perf_counter()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.events.clear()
+            self.origin = time.perf_counter()
+
+    def record(self, name, start, end):
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.add(end - start)
+            self.events.append((name, start, end, threading.get_ident()))
+
+    def stage(self, name):
+        return ProfiledStage(self, name)
+
+    def last(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            return None
+        return stats.last
+
+    def summary(self):
+        """Milliseconds per stage: count, total, mean, max and last."""
+        with self.lock:
+            return dict((name, {'count': stats.count,
+                                'total_ms': stats.total * 1e3,
+                                'mean_ms': stats.total / stats.count * 1e3,
+                                'max_ms': stats.max * 1e3,
+                                'last_ms': stats.last * 1e3})
+                        for name, stats in self.stages.items())
+
+    def trace_events(self):
+        with self.lock:
+            events = list(self.events)
+        return [{'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                 'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6}
+                for name, start, end, tid in events]
+
+    def dump(self, filename):
+        """Writes a Chrome trace event file with the stage summary alongside."""
+        trace = {'traceEvents': self.trace_events(),
+                 'displayTimeUnit': 'ms',
+                 'otherData': {'summary': self.summary()}}
+        with open(filename, 'w') as tracefile:
+            json.dump(trace, tracefile)
+
+
+class ProfiledStage():
+    """Context manager timing a block, for code that is not a whole function."""
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if self.profiler.enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            self.profiler.record(self.name, self.start, time.perf_counter())
+            self.start = None
+        return False
+
+
+profiler = Profiler(enabled=bool(os.environ.get('QCMD_PROFILE')))
+
+
+def timed(name):
+    """Decorator recording each call of the function as the stage name."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.record(name, start, time.perf_counter())
+        return wrapper
+    return decorator
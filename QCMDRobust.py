@@ -0,0 +1,187 @@
+"""Fit engines other than least squares, for noisy and outlying harmonics.
+
+Every engine takes x and a (samples, columns) array and returns the
+(columns, 6) layout of fit_lines: slope, intercept, r and p value of x
+against each column and the normaltest of the residuals about the line the
+engine chose. All columns of a selection are fitted together.
+
+    huber       iteratively reweighted least squares with Huber weights
+    theil_sen   median of pairwise slopes, from a fixed random sample of pairs
+                once a window has more pairs than that
+    weighted    inverse variance weighted least squares, with each sample's
+                variance taken from the local spread of first differences
+"""
+import numpy as np
+
+from QCMDFitting import correlation_p_value, fit_lines, residual_normaltest
+from QCMDProfiler import timed
+
+#Tuning constant giving 95% efficiency on normal noise
+HUBER_CONSTANT = 1.345
+
+
+def as_columns(x, harmonics):
+    x = np.asarray(x, dtype=np.float64)
+    harmonics = np.asarray(harmonics, dtype=np.float64)
+    if harmonics.ndim == 1:
+        harmonics = harmonics[:, np.newaxis]
+    return x, harmonics
+
+
+def line_results(x, harmonics, slope, intercept):
+    """fit_lines layout for the given lines through every column."""
+    dx = x - x.mean()
+    dy = harmonics - harmonics.mean(axis=0)
+    ssxym = dx.dot(dy)
+    ssym = np.einsum('ij,ij->j', dy, dy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_value = np.where(ssym == 0, 0.0, ssxym / np.sqrt(dx.dot(dx) * ssym))
+    r_value = np.clip(r_value, -1.0, 1.0)
+    p_value = correlation_p_value(r_value, len(x) - 2)
+    k2, p_norm_value = residual_normaltest(harmonics - intercept - np.outer(x, slope))
+    return np.column_stack((slope, intercept, r_value, p_value, k2, p_norm_value))
+
+
+def weighted_lines(powers, harmonics, weights, stacked=None):
+    """Slope and intercept of every column fitted with its own column of weights.
+
+    powers is the (3, samples) stack of 1, u and u * u, so all the weighted
+    sums come from one matrix product with the weights and weighted samples
+    side by side in stacked, which may be given to reuse it.
+    """
+    columns = harmonics.shape[1]
+    if stacked is None:
+        stacked = np.empty((len(harmonics), 2 * columns))
+    if not np.shares_memory(weights, stacked):
+        stacked[:, :columns] = weights
+    np.multiply(weights, harmonics, out=stacked[:, columns:])
+    sums = powers.dot(stacked)
+    sw, su, suu = sums[0, :columns], sums[1, :columns], sums[2, :columns]
+    sy, suy = sums[0, columns:], sums[1, columns:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (sw * suy - su * sy) / (sw * suu - su * su)
+    return slope, (sy - slope * su) / sw
+
+
+def centred_powers(x):
+    x_mean = x.mean()
+    u = x - x_mean
+    return x_mean, u, np.vstack((np.ones(len(u)), u, u * u))
+
+
+def robust_scale(residuals, samples=20000):
+    """Normal consistent median absolute deviation of every column.
+
+    Long windows use about samples residuals spread over the whole window.
+    """
+    #One contiguous row per column, which the partitions of median run along
+    rows = np.ascontiguousarray(residuals[::max(1, len(residuals) // samples)].T)
+    rows -= np.median(rows, axis=1)[:, np.newaxis]
+    np.abs(rows, out=rows)
+    scale = 1.4826 * np.median(rows, axis=1)
+    if np.all(scale > 0):
+        return scale
+    #Mostly identical residuals, such as quantised samples, fall back to their spread
+    return np.where(scale > 0, scale, residuals.std(axis=0))
+
+
+@timed('fit_huber')
+def fit_huber(x, harmonics, tuning=HUBER_CONSTANT, iterations=50, tolerance=1e-9):
+    x, harmonics = as_columns(x, harmonics)
+    x_mean, u, powers = centred_powers(x)
+    #The weights live in the first half of the buffer the weighted sums are taken over
+    stacked = np.empty((len(x), 2 * harmonics.shape[1]))
+    weights = stacked[:, :harmonics.shape[1]]
+    weights[:] = 1.0
+    residuals = np.empty_like(harmonics)
+    slope, intercept = weighted_lines(powers, harmonics, weights, stacked)
+    for iteration in range(iterations):
+        np.outer(u, -slope, out=residuals)
+        residuals += harmonics
+        residuals -= intercept
+        limit = tuning * robust_scale(residuals)
+        #Weight 1 within limit of the line and limit / |residual| beyond it
+        np.abs(residuals, out=residuals)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(limit, residuals, out=weights)
+        np.minimum(weights, 1.0, out=weights)
+        previous = slope
+        slope, intercept = weighted_lines(powers, harmonics, weights, stacked)
+        if np.all(np.abs(slope - previous) <= tolerance * (np.abs(slope) + tolerance)):
+            break
+    return line_results(x, harmonics, slope, intercept - slope * x_mean)
+
+
+@timed('fit_theil_sen')
+def fit_theil_sen(x, harmonics, pairs=200000, seed=0):
+    """Theil-Sen fit, exact up to pairs pairs of samples and sampled beyond.
+
+    The sample of pairs is seeded, so a window always gets the same fit.
+    """
+    x, harmonics = as_columns(x, harmonics)
+    n = len(x)
+    if n * (n - 1) // 2 <= pairs:
+        first, second = np.triu_indices(n, 1)
+    else:
+        random = np.random.default_rng(seed)
+        first = random.integers(0, n, pairs)
+        second = random.integers(0, n, pairs)
+    run = x[second] - x[first]
+    distinct = run != 0
+    first, second, run = first[distinct], second[distinct], run[distinct]
+    slope = np.median((harmonics[second] - harmonics[first]) / run[:, np.newaxis], axis=0)
+    intercept = np.median(harmonics - np.outer(x, slope), axis=0)
+    return line_results(x, harmonics, slope, intercept)
+
+
+def local_variance(harmonics, span):
+    """Noise variance around every sample, half the mean squared first difference over span samples."""
+    steps = np.diff(harmonics, axis=0)
+    squared = np.concatenate((steps[:1], steps)) ** 2 / 2
+    prefix = np.zeros((len(squared) + 1, squared.shape[1]))
+    np.cumsum(squared, axis=0, out=prefix[1:])
+    index = np.arange(len(squared))
+    low = np.maximum(index - span // 2, 0)
+    high = np.minimum(index + span // 2 + 1, len(squared))
+    return (prefix[high] - prefix[low]) / (high - low)[:, np.newaxis]
+
+
+@timed('fit_weighted')
+def fit_weighted(x, harmonics, variances=None, span=None):
+    """Weighted least squares with weights 1 / variance.
+
+    Without variances they are estimated over span samples, by default a
+    fiftieth of the window and at least 25 samples.
+    """
+    x, harmonics = as_columns(x, harmonics)
+    n = len(x)
+    if variances is None:
+        variances = local_variance(harmonics, span or max(25, n // 50))
+    variances = np.broadcast_to(np.asarray(variances, dtype=np.float64).reshape(n, -1), harmonics.shape)
+    floor = np.maximum(variances.max(axis=0) * 1e-12, np.finfo(np.float64).tiny)
+    weights = 1.0 / np.maximum(variances, floor)
+
+    x_mean, u, powers = centred_powers(x)
+    slope, intercept = weighted_lines(powers, harmonics, weights)
+    #r and the normaltest of the weighted problem, residuals scaled by their own noise
+    sw = weights.sum(axis=0)
+    du = u[:, np.newaxis] - u.dot(weights) / sw
+    dy = harmonics - (weights * harmonics).sum(axis=0) / sw
+    sxy = np.einsum('ij,ij->j', weights * du, dy)
+    sxx = np.einsum('ij,ij->j', weights * du, du)
+    syy = np.einsum('ij,ij->j', weights * dy, dy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_value = np.where(syy == 0, 0.0, sxy / np.sqrt(sxx * syy))
+    r_value = np.clip(r_value, -1.0, 1.0)
+    p_value = correlation_p_value(r_value, n - 2)
+    k2, p_norm_value = residual_normaltest((harmonics - intercept - np.outer(u, slope)) * np.sqrt(weights))
+    return np.column_stack((slope, intercept - slope * x_mean, r_value, p_value, k2, p_norm_value))
+
+
+#Name: (label in the Fit Engine menu, function)
+FIT_ENGINES = {
+    'ols': ('Least Squares', fit_lines),
+    'huber': ('Huber', fit_huber),
+    'theil_sen': ('Theil-Sen', fit_theil_sen),
+    'weighted': ('Inverse Variance Weighted', fit_weighted),
+}
@@ -0,0 +1,183 @@
+"""Automatic detection of linear regions in a run.
+
+Fits a piecewise-linear model to the chosen harmonics together by binary
+segmentation. Every segment cost is the summed line fit error of the
+harmonics, each scaled by its own noise level, and comes from cumulative
+sums in constant time. A split is kept while it lowers the cost by more than
+a BIC style penalty. The segments whose fit error is close to the noise are
+proposed as fit windows.
+"""
+import numpy as np
+
+from QCMDProfiler import timed
+
+
+class SegmentCost():
+    """Noise scaled line fit error of any sample range start:end in O(1)."""
+    def __init__(self, x, harmonics):
+        x = np.asarray(x, dtype=np.float64)
+        harmonics = np.asarray(harmonics, dtype=np.float64)
+        if harmonics.ndim == 1:
+            harmonics = harmonics[:, np.newaxis]
+        #Centred and scaled so the sums stay well conditioned and every harmonic weighs the same
+        u = x - x.mean()
+        scale = np.abs(u).max() or 1.0
+        u /= scale
+        v = (harmonics - harmonics.mean(axis=0)) / noise_level(harmonics)
+        self.prefix_u = cumulative(u)
+        self.prefix_uu = cumulative(u * u)
+        self.prefix_v = cumulative(v)
+        self.prefix_uv = cumulative(u[:, np.newaxis] * v)
+        self.prefix_vv = cumulative(np.einsum('ij,ij->i', v, v))
+        self.columns = v.shape[1]
+
+    def __call__(self, start, end):
+        """Cost of start:end, where either bound may be an array of the same length."""
+        count = np.asarray(end - start, dtype=np.float64)
+        su = self.prefix_u[end] - self.prefix_u[start]
+        suu = self.prefix_uu[end] - self.prefix_uu[start]
+        sv = self.prefix_v[end] - self.prefix_v[start]
+        suv = self.prefix_uv[end] - self.prefix_uv[start]
+        svv = self.prefix_vv[end] - self.prefix_vv[start]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sxx = suu - su * su / count
+            sxy = suv - su[..., np.newaxis] * sv / count[..., np.newaxis]
+            explained = (sv * sv).sum(axis=-1) / count + np.where(sxx > 0, (sxy * sxy).sum(axis=-1) / sxx, 0.0)
+        return np.maximum(svv - explained, 0.0)
+
+
+def cumulative(values):
+    prefix = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=prefix[1:])
+    return prefix
+
+
+def noise_level(harmonics, samples=100000):
+    """Sample noise of every column from the median absolute first difference.
+
+    Differencing removes any slowly varying trend, so drift and steps barely
+    change the estimate. Long runs use about samples differences spread over
+    the whole run.
+    """
+    stride = max(1, len(harmonics) // samples)
+    differences = harmonics[1::stride] - harmonics[:-1:stride]
+    sigma = 1.4826 * np.median(np.abs(differences - np.median(differences, axis=0)), axis=0) / np.sqrt(2)
+    #A column without noise, quantised or constant, falls back to its spread
+    spread = harmonics[::stride].std(axis=0)
+    sigma = np.where(sigma > 0, sigma, spread)
+    return np.where(sigma > 0, sigma, 1.0)
+
+
+def best_split(cost, start, end, min_size, grid=2000):
+    """Split point of start:end with the lowest total cost, and that cost.
+
+    Candidates are scored on a grid of at most grid points, then every sample
+    around the best of them is scored.
+    """
+    first, last = start + min_size, end - min_size
+    if first > last:
+        return None, np.inf
+    step = max(1, (last - first) // grid)
+    candidates = np.arange(first, last + 1, step)
+    totals = cost(start, candidates) + cost(candidates, end)
+    best = candidates[np.argmin(totals)]
+    if step > 1:
+        candidates = np.arange(max(first, best - step), min(last, best + step) + 1)
+        totals = cost(start, candidates) + cost(candidates, end)
+        best = candidates[np.argmin(totals)]
+    return int(best), float(totals.min())
+
+
+def segment_lines(x, harmonics, min_size=None, penalty=None, max_segments=50):
+    """Breakpoints of a piecewise-linear fit to every column of harmonics.
+
+    Returns sample indices from 0 to len(x), so segment i is
+    breakpoints[i]:breakpoints[i + 1]. penalty is the cost a split has to
+    save, by default the BIC of one more line in every harmonic plus the
+    breakpoint itself.
+    """
+    return split_segments(SegmentCost(x, harmonics), len(x), min_size, penalty, max_segments)
+
+
+@timed('segment_lines')
+def split_segments(cost, n, min_size=None, penalty=None, max_segments=50):
+    if min_size is None:
+        min_size = max(10, n // 500)
+    if penalty is None:
+        penalty = (2 * cost.columns + 1) * np.log(max(n, 2))
+
+    breakpoints = [0, n]
+    #(gain, start, end, split) of every segment that could still be split
+    candidates = [split_gain(cost, 0, n, min_size)]
+    while candidates and len(breakpoints) - 1 < max_segments:
+        #The segment that gains most is split first, so max_segments keeps the strongest breaks
+        gain, start, end, split = max(candidates)
+        if split is None or gain <= penalty:
+            break
+        candidates.remove((gain, start, end, split))
+        breakpoints.append(split)
+        candidates.extend([split_gain(cost, start, split, min_size), split_gain(cost, split, end, min_size)])
+    return refine_breakpoints(cost, sorted(breakpoints), min_size, penalty)
+
+
+def refine_breakpoints(cost, breakpoints, min_size, penalty, rounds=10):
+    """Moves every breakpoint to its best place between its neighbours and drops
+    the ones not worth their penalty.
+
+    Binary segmentation can split a run between two real breaks first and
+    never revisit that split, this settles such leftovers.
+    """
+    for iteration in range(rounds):
+        changed = False
+        for index in range(1, len(breakpoints) - 1):
+            split, total = best_split(cost, breakpoints[index - 1], breakpoints[index + 1], min_size)
+            if split is not None and split != breakpoints[index]:
+                breakpoints[index] = split
+                changed = True
+        while len(breakpoints) > 2:
+            #Cost added by merging the two segments either side of each breakpoint
+            losses = [float(cost(breakpoints[index - 1], breakpoints[index + 1]) -
+                            cost(breakpoints[index - 1], breakpoints[index]) -
+                            cost(breakpoints[index], breakpoints[index + 1]))
+                      for index in range(1, len(breakpoints) - 1)]
+            weakest = int(np.argmin(losses))
+            if losses[weakest] > penalty:
+                break
+            del breakpoints[weakest + 1]
+            changed = True
+        if not changed:
+            break
+    return np.array(breakpoints)
+
+
+def split_gain(cost, start, end, min_size):
+    split, total = best_split(cost, start, end, min_size)
+    if split is None:
+        return (-np.inf, start, end, None)
+    return (float(cost(start, end)) - total, start, end, split)
+
+
+def linear_regions(x, harmonics, min_size=None, penalty=None, max_segments=50, tolerance=2.0):
+    """Sample windows (start, end) of the segments that are straight within the noise.
+
+    A segment is kept when its line fit error per degree of freedom is at
+    most tolerance times the noise variance, averaged over the harmonics.
+    """
+    #Segments are found among the samples finite in every column, such as dD/df away from df = 0
+    finite = np.isfinite(harmonics).reshape(len(x), -1).all(axis=1)
+    if not finite.all():
+        kept = np.flatnonzero(finite)
+        if not len(kept):
+            return []
+        windows = linear_regions(np.asarray(x)[kept], np.asarray(harmonics)[kept], min_size, penalty,
+                                 max_segments, tolerance)
+        return [(int(kept[start]), int(kept[end - 1]) + 1) for start, end in windows]
+
+    cost = SegmentCost(x, harmonics)
+    breakpoints = split_segments(cost, len(x), min_size, penalty, max_segments)
+    windows = list()
+    for start, end in zip(breakpoints[:-1], breakpoints[1:]):
+        freedom = (end - start - 2) * cost.columns
+        if freedom > 0 and cost(start, end) / freedom <= tolerance:
+            windows.append((int(start), int(end)))
+    return windows
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class TimeIndex():
+    """Nearest-sample lookup on a time axis in O(log n).
+
+    Monotonic time axes are searched directly. Anything else is argsorted once
+    and searched through the sort order, so lookups stay logarithmic and pick
+    the same sample as a full argmin scan.
+    """
+    def __init__(self, time):
+        self.time = np.asarray(time)
+        self.monotonic = len(self.time) < 2 or bool(np.all(np.diff(self.time) >= 0))
+        if self.monotonic:
+            self.order = None
+            self.sorted_time = self.time
+        else:
+            self.order = np.argsort(self.time, kind='stable')
+            self.sorted_time = self.time[self.order]
+
+    def extend(self, time):
+        """Takes the grown time axis, of which the old samples are unchanged."""
+        start = len(self.time)
+        time = np.asarray(time)
+        if self.monotonic and bool(np.all(np.diff(time[max(start - 1, 0):]) >= 0)):
+            self.time = time
+            self.sorted_time = time
+        else:
+            self.__init__(time)
+
+    def nearest(self, value):
+        if value is None:
+            raise TypeError("No time value to look up")
+        sorted_time = self.sorted_time
+        right = int(np.searchsorted(sorted_time, value))
+        if right == 0:
+            index = 0
+        elif right == len(sorted_time):
+            index = right - 1
+        elif value - sorted_time[right - 1] <= sorted_time[right] - value:
+            #Ties go to the earlier sample, as argmin does
+            index = right - 1
+        else:
+            index = right
+        if self.order is not None:
+            index = int(self.order[index])
+        return index
+
+    def nearest_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        right = np.clip(np.searchsorted(self.sorted_time, values), 1, len(self.sorted_time) - 1)
+        left = right - 1
+        #Ties go to the earlier sample, as argmin does
+        closer_left = (values - self.sorted_time[left]) <= (self.sorted_time[right] - values)
+        index = np.where(closer_left, left, right)
+        if len(self.sorted_time) == 1:
+            index = np.zeros_like(index)
+        if self.order is not None:
+            index = self.order[index]
+        return index
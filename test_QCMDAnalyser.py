@@ -0,0 +1,169 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from PyQt5 import QtCore, QtWidgets
+
+from QCMDAnalyser import ApplicationWindow, DataValuesModel, QCMDDataFollower, QCMDDataReader
+from QCMDBaseline import BaselineCorrection
+from QCMDFitting import RESULT_HEADERS, empty_results, fit_lines, result_records
+
+
+class TestQCMDDataReader(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        self.reader = QCMDDataReader('Book4.csv', use_cache=False)
+
+    def test_time_length(self):
+        self.assertEqual(len(self.reader.get_time()), 30983)
+
+    def test_time_values(self):
+        time = self.reader.get_time()
+        self.assertEqual(time[0],-0.59982)
+        self.assertEqual(time[-1], 19.31301)
+
+    def test_harmonics_length(self):
+        self.assertEqual(len(self.reader.get_harmonics()),6)
+
+    def test_harmonic_values(self):
+        harmonic3 = self.reader.get_harmonics()[0]
+        self.assertEqual(harmonic3[0],29.39353)
+        self.assertEqual(harmonic3[-1], 23.21427)
+
+    def test_dissapation_length(self):
+        self.assertEqual(len(self.reader.get_dissapation()),6)
+
+    def test_dissapation_values(self):
+        diss = self.reader.get_dissapation()[0]
+        self.assertEqual(diss[0],-10.17701)
+        self.assertEqual(diss[-1], -12.68919)
+
+    def test_columns_are_views(self):
+        data = self.reader.data
+        self.assertEqual(data.dtype, np.float64)
+        self.assertTrue(np.shares_memory(self.reader.get_time(), data))
+        self.assertTrue(np.shares_memory(self.reader.get_harmonics()[5], data))
+        self.assertTrue(self.reader.get_dissapation()[0].flags['C_CONTIGUOUS'])
+
+    def test_skips_header_and_short_rows(self):
+        lines = ['time,F3', '1,2,3,4,5,6,7,8,9,10,11,12,13', '1,2,3',
+                 'a,b,c,d,e,f,g,h,i,j,k,l,m', '2,2,3,4,5,6,7,8,9,10,11,12,13,,', ',,,,,,,,,,,,,']
+        data = self.reader.parse_lines(lines)
+        self.assertEqual(data.shape, (2, 13))
+        self.assertEqual(list(data[:, 0]), [1.0, 2.0])
+
+    def test_quoted_fields(self):
+        lines = ['"time","F3"', ','.join('"{}"'.format(value) for value in range(1, 14)),
+                 '2,2,3,4,5,6,7,8,9,10,11,12,"13"', '"a",b,c,d,e,f,g,h,i,j,k,l,m']
+        data = self.reader.parse_lines(lines)
+        self.assertEqual(data.shape, (2, 13))
+        self.assertEqual(list(data[:, 12]), [13.0, 13.0])
+        self.assertTrue(data.flags.f_contiguous)
+
+class TestDataValuesModel(unittest.TestCase):
+
+    def setUp(self):
+        fits = np.array([[0.5, 1.0, 0.9, 0.0, 2.0, 0.3],
+                         [-1.25, 2.0, 0.8, 0.01, 3.0, 0.2],
+                         [2.0, 3.0, 0.7, 0.02, 4.0, 0.1]])
+        self.values = result_records(['F3', 'F5', 'F7'], fits, 1)
+        self.model = DataValuesModel(empty_results(), [RESULT_HEADERS])
+
+    def test_incremental_insert(self):
+        inserted = list()
+        self.model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+        self.model.set_values(self.values[:1])
+        self.model.set_values(self.values)
+        self.assertEqual(inserted, [(0, 0), (1, 2)])
+        self.assertEqual(self.model.rowCount(), 3)
+        self.assertEqual(self.model.data(self.model.index(1, 1), QtCore.Qt.DisplayRole), '-1.25')
+
+    def test_sort(self):
+        self.model.set_values(self.values)
+        self.model.sort(1, QtCore.Qt.DescendingOrder)
+        ids = [self.model.data(self.model.index(row, 0), QtCore.Qt.DisplayRole) for row in range(3)]
+        self.assertEqual(ids, ['F7 1', 'F3 1', 'F5 1'])
+
+
+class TestQCMDDataFollower(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        with open('Book4.csv', newline='') as csvfile:
+            self.lines = csvfile.read().splitlines(True)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_follow_growing_file(self):
+        follower = QCMDDataFollower(self.filename)
+        self.assertEqual(follower.poll(), 0)
+        with open(self.filename, 'w', newline='') as csvfile:
+            csvfile.writelines(self.lines[:1000])
+            #Half a row, the rest is written later
+            csvfile.write(self.lines[1000][:10])
+        first = follower.poll()
+        with open(self.filename, 'a', newline='') as csvfile:
+            csvfile.write(self.lines[1000][10:])
+            csvfile.writelines(self.lines[1001:])
+        follower.poll()
+
+        reader = QCMDDataReader('Book4.csv', use_cache=False)
+        self.assertLess(first, len(reader.get_time()))
+        self.assertTrue(np.array_equal(follower.data, reader.data))
+        self.assertTrue(np.array_equal(follower.get_dissapation()[5], reader.get_dissapation()[5]))
+
+    def test_follow_with_drift_baseline(self):
+        baseline = BaselineCorrection('drift', (0.0, 0.5))
+        follower = QCMDDataFollower(self.filename, baseline)
+        with open(self.filename, 'w', newline='') as csvfile:
+            csvfile.writelines(self.lines[:1000])
+        follower.poll()
+        #The reference window has not been reached, the rows are as read
+        self.assertIsNone(follower.reference)
+        self.assertFalse(follower.restarted)
+        with open(self.filename, 'a', newline='') as csvfile:
+            csvfile.writelines(self.lines[1000:6000])
+        follower.poll()
+        self.assertTrue(follower.restarted)
+        with open(self.filename, 'a', newline='') as csvfile:
+            csvfile.writelines(self.lines[6000:])
+        follower.poll()
+
+        reader = QCMDDataReader('Book4.csv', use_cache=False, baseline=baseline)
+        self.assertTrue(np.allclose(follower.data, reader.data, rtol=0, atol=1e-9))
+        self.assertAlmostEqual(float(np.mean(reader.get_harmonics()[0][1000:2000])), 0.0, delta=0.5)
+
+
+class TestSharedSelections(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    def test_fit_tab_never_shown(self):
+        window = ApplicationWindow()
+        window.show_reader(QCMDDataReader('Book4.csv', use_cache=False))
+        #Only the Frequency tab is shown, its graph makes the selections
+        graph = window.freq_graph.get_graph()
+        graph.add_window_selection(2000, 12000, 1)
+        graph.add_window_selection(20000, 30000, 2)
+        graph.data_line_num = 2
+        graph.notify_selections()
+        self.assertIsNone(window.diss_graph.graph)
+
+        freq_values, diss_values = window.calculate_fits(
+            window.freq_graph.get_selected_data(), window.diss_graph.get_selected_data(), window.harmonic_check_box.get_checkboxes_values(),
+            window.freq_graph.fit_settings(), window.diss_graph.fit_settings())
+        self.assertEqual(len(freq_values), 2)
+        self.assertEqual(len(diss_values), 2)
+        for values, quantity in ((freq_values, 'frequency'), (diss_values, 'dissipation')):
+            for value, (start, end) in zip(values, [(2000, 12000), (20000, 30000)]):
+                xdata, harmonics = window.dataset.window_data(quantity, start, end)
+                self.assertAlmostEqual(value['slope'], fit_lines(xdata, harmonics[0])[0, 0])
+        #The windows come along when the Dissipation tab is first shown
+        self.assertEqual(window.diss_graph.get_graph().selection_windows(), [(2000, 12000), (20000, 30000)])
+        window.close()
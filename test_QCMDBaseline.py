@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from QCMDBaseline import BaselineCorrection
+
+
+class TestBaselineCorrection(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(7)
+        time = np.linspace(0, 10, 2000)
+        self.drift = np.array([0.5, -2.0, 0.0])
+        values = time[:, np.newaxis] * self.drift + np.array([10.0, 200.0, -5.0])
+        values[1000:] += 3.0
+        self.data = np.asfortranarray(np.column_stack((time, values + random.standard_normal(values.shape) * 0.01)))
+
+    def test_first_sample(self):
+        expected = self.data[:, 1:] - self.data[0, 1:]
+        corrected = BaselineCorrection('first')(self.data)
+        self.assertIs(corrected, self.data)
+        self.assertTrue(np.allclose(corrected[:, 1:], expected))
+        self.assertEqual(corrected[5, 0], 5 * 10 / 1999.0)
+
+    def test_window_mean(self):
+        corrected = BaselineCorrection('window', (1, 2))(self.data)
+        reference = (corrected[:, 0] >= 1) & (corrected[:, 0] <= 2)
+        self.assertTrue(np.allclose(corrected[reference, 1:].mean(axis=0), 0))
+
+    def test_drift_line(self):
+        corrected = BaselineCorrection('drift', (0, 4))(self.data)
+        self.assertTrue(np.allclose(corrected[:1000, 1:], 0, atol=0.05))
+        self.assertTrue(np.allclose(corrected[1000:, 1:], 3, atol=0.05))
+
+    def test_read_only_is_copied(self):
+        self.data.flags.writeable = False
+        original = self.data.copy()
+        corrected = BaselineCorrection('drift', (0, 4))(self.data)
+        self.assertIsNot(corrected, self.data)
+        self.assertTrue(np.array_equal(self.data, original))
+        self.assertTrue(np.array_equal(corrected[:, 0], original[:, 0]))
+        self.assertTrue(corrected.flags.f_contiguous)
+
+    def test_none_and_bad_options(self):
+        original = self.data.copy()
+        self.assertTrue(np.array_equal(BaselineCorrection('none')(self.data), original))
+        self.assertRaises(ValueError, BaselineCorrection, 'drift')
+        self.assertRaises(ValueError, BaselineCorrection, 'median')
+        self.assertRaises(ValueError, BaselineCorrection('window', (20, 30)), self.data)
+
+    def test_ready(self):
+        baseline = BaselineCorrection('window', (1, 2))
+        self.assertFalse(baseline.ready(self.data[:300, 0]))
+        self.assertTrue(baseline.ready(self.data[:500, 0]))
+        self.assertTrue(BaselineCorrection('first').ready(self.data[:1, 0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+
+import numpy as np
+
+from QCMDAnalyser import QCMDDataReader
+from QCMDBatch import expand_filenames, fit_file, load_selections, run_batch
+from QCMDBootstrap import BootstrapIntervals
+from QCMDExport import load_results
+from QCMDFitting import RESULT_HEADERS, fit_lines
+from QCMDRobust import fit_huber
+from QCMDTimeIndex import TimeIndex
+
+
+class TestQCMDBatch(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.output = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.output)
+
+    def test_fit_file(self):
+        harmonic_check = ['F3', False, 'F7', False, False, False]
+        results = fit_file('Book4.csv', [(2.0, 6.0)], harmonic_check, use_cache=False)
+        self.assertEqual(list(results['frequency']['id']), ['Book4.csv F3 1', 'Book4.csv F7 1'])
+
+        reader = QCMDDataReader('Book4.csv', use_cache=False)
+        time = reader.get_time()
+        index = TimeIndex(time)
+        start, end = index.nearest(2.0), index.nearest(6.0)
+        slope = fit_lines(time[start:end], reader.get_dissapation()[2][start:end])[0][0]
+        self.assertAlmostEqual(results['dissipation']['slope'][1], slope, places=12)
+
+    def test_fit_file_engine(self):
+        harmonic_check = ['F3', False, False, False, False, False]
+        results = fit_file('Book4.csv', [(2.0, 6.0)], harmonic_check, use_cache=False,
+                           bootstrap=BootstrapIntervals(100, seed=0), engine='huber')
+        self.assertEqual(list(results['frequency']['id']), ['Book4.csv huber F3 1'])
+        #Bootstrap intervals are of least squares lines, so a Huber fit has none
+        self.assertTrue(np.isnan(results['frequency']['slope_low'][0]))
+
+        reader = QCMDDataReader('Book4.csv', use_cache=False)
+        time = reader.get_time()
+        index = TimeIndex(time)
+        start, end = index.nearest(2.0), index.nearest(6.0)
+        slope = fit_huber(time[start:end], reader.get_harmonics()[0][start:end])[0][0]
+        self.assertAlmostEqual(results['frequency']['slope'][0], slope, places=12)
+
+    def test_run_batch(self):
+        harmonic_check = ['F3', 'F5', False, False, False, False]
+        run_batch(['Book4.csv', 'Book4.csv'], [(2.0, 6.0), (8.0, 12.0)], harmonic_check,
+                  self.output, workers=2, use_cache=False)
+        with open(self.output, newline='') as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual(rows[0], RESULT_HEADERS)
+        self.assertEqual(len(rows), 1 + 8 + 1 + 1 + 8)
+        self.assertEqual(rows[9], [])
+        self.assertEqual(rows[1][1:], rows[5][1:])
+
+    def test_mixed_directory(self):
+        directory = tempfile.mkdtemp()
+        try:
+            shutil.copy('Book4.csv', os.path.join(directory, 'run.csv'))
+            selections = os.path.join(directory, 'selections.csv')
+            with open(selections, 'w') as csvfile:
+                csvfile.write('start,end\n2.0,6.0\n')
+            with open(os.path.join(directory, 'notes.csv'), 'w') as csvfile:
+                csvfile.write('sample,buffer\n')
+            filenames = expand_filenames([directory], self.output, selections)
+            self.assertEqual([os.path.basename(name) for name in filenames], ['notes.csv', 'run.csv'])
+            stderr = io.StringIO()
+            with redirect_stderr(stderr):
+                results = run_batch(filenames, load_selections(selections), ['F3', False, False, False, False, False],
+                                    self.output, workers=1, use_cache=False)
+            self.assertEqual(list(results['frequency']['id']), ['run.csv F3 1'])
+            self.assertIn('notes.csv', stderr.getvalue())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_run_batch_npz(self):
+        output = self.output[:-4] + '.npz'
+        harmonic_check = ['F3', False, False, False, False, 'F13']
+        run_batch(['Book4.csv'], [(2.0, 6.0)], harmonic_check, output, workers=1, use_cache=False)
+        arrays = load_results(output)
+        os.remove(output)
+        self.assertEqual(list(arrays['dissipation_results']['id']), ['Book4.csv F3 1', 'Book4.csv F13 1'])
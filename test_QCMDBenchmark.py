@@ -0,0 +1,32 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from QCMDAnalyser import QCMDDataReader
+from QCMDBenchmark import compare, generate_qcmd_file, run_suite
+
+
+class TestQCMDBenchmark(unittest.TestCase):
+
+    def test_run_suite(self):
+        results = run_suite([2000], sensors=2, harmonics=3, selections=4)
+        run = results['runs'][0]
+        self.assertEqual(run['rows'], 2000)
+        for stage in ('parse', 'cached_open', 'nearest_lookup', 'fit', 'export_csv', 'parse_sensors'):
+            self.assertGreater(run['stages'][stage]['seconds'], 0)
+        json.dumps(results)
+        self.assertEqual(len(compare(results, results)), len(run['stages']))
+
+    def test_generated_file_reads_back(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'run.csv')
+            generate_qcmd_file(filename, 1234, chunk_size=500)
+            time = QCMDDataReader(filename, use_cache=False).get_time()
+            self.assertTrue(np.allclose(time, np.linspace(-0.6, 1234 / 1600.0, 1234), atol=1e-5))
+        finally:
+            shutil.rmtree(directory)
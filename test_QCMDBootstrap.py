@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+from scipy import stats
+
+from QCMDBootstrap import BootstrapIntervals, bootstrap_lines, resample_weights
+
+
+class TestBootstrapIntervals(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        random = np.random.RandomState(9)
+        self.x = np.linspace(0, 10, 4000)
+        self.harmonics = np.column_stack((2 * self.x + random.standard_normal(len(self.x)) * 0.5,
+                                          -self.x + 3 + random.standard_normal(len(self.x))))
+
+    def test_weights(self):
+        random = np.random.default_rng(0)
+        weights = resample_weights(random, 50, 20)
+        self.assertEqual(weights.shape, (20, 50))
+        self.assertTrue(np.all(weights.sum(axis=1) == 50))
+        #Seven whole blocks and one of a single sample
+        blocks = resample_weights(random, 50, 20, block=7)
+        self.assertTrue(np.all(blocks.sum(axis=1) == 50))
+        self.assertTrue(np.all(resample_weights(random, 50, 20, block=49).sum(axis=1) == 50))
+        self.assertTrue(np.all(resample_weights(random, 49, 20, block=7).sum(axis=1) == 49))
+
+    def test_weighted_lines_match_resampled_fits(self):
+        #Every resample fitted from its weights equals fitting the drawn samples themselves
+        weights = resample_weights(np.random.default_rng(5), len(self.x), 3)
+        slopes, intercepts = bootstrap_lines(self.x, self.harmonics, 3, seed=5)
+        for row in range(3):
+            index = np.repeat(np.arange(len(self.x)), weights[row].astype(int))
+            fit = stats.linregress(self.x[index], self.harmonics[index, 1])
+            self.assertAlmostEqual(slopes[row, 1], fit.slope, places=9)
+            self.assertAlmostEqual(intercepts[row, 1], fit.intercept, places=9)
+
+    def test_interval_covers_analytic(self):
+        intervals = BootstrapIntervals(1000, seed=1)(self.x, self.harmonics)
+        self.assertEqual(intervals.shape, (2, 4))
+        for column in range(2):
+            fit = stats.linregress(self.x, self.harmonics[:, column])
+            low, high = fit.slope - 1.96 * fit.stderr, fit.slope + 1.96 * fit.stderr
+            self.assertLess(intervals[column, 0], fit.slope)
+            self.assertGreater(intervals[column, 1], fit.slope)
+            self.assertAlmostEqual((intervals[column, 1] - intervals[column, 0]) / (high - low), 1.0, delta=0.15)
+            self.assertLess(intervals[column, 2], fit.intercept)
+            self.assertGreater(intervals[column, 3], fit.intercept)
+
+    def test_seeded_and_pooled(self):
+        first = BootstrapIntervals(200, block=20, seed=3)(self.x, self.harmonics)
+        self.assertTrue(np.array_equal(first, BootstrapIntervals(200, block=20, seed=3)(self.x, self.harmonics)))
+        pooled = BootstrapIntervals(200, block=20, workers=2, seed=3)
+        try:
+            intervals = pooled(self.x, self.harmonics)
+        finally:
+            pooled.close()
+        self.assertTrue(np.allclose(intervals, first, rtol=0.2))
+
+    def test_bad_settings(self):
+        self.assertRaises(ValueError, BootstrapIntervals, 1)
+        self.assertRaises(ValueError, BootstrapIntervals, 100, 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+
+import numpy as np
+
+from QCMDBuffer import GrowableArray
+
+
+class TestGrowableArray(unittest.TestCase):
+
+    def test_append_rows(self):
+        array = GrowableArray(3, capacity=2)
+        array.append(np.ones((3, 3)))
+        array.append(np.zeros((4, 3)))
+        self.assertEqual(array.view().shape, (7, 3))
+        self.assertEqual(array.view()[:, 0].sum(), 3)
+        self.assertTrue(array.view()[:, 1].flags['C_CONTIGUOUS'])
+
+    def test_truncate(self):
+        array = GrowableArray(dtype=np.intp)
+        array.append([1, 2, 3])
+        array.truncate(1)
+        array.append([4])
+        self.assertEqual(list(array.view()), [1, 4])
@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from QCMDDataCache import QCMDDataCache
+
+
+class TestQCMDDataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'run.csv')
+        with open(self.filename, 'w') as csvfile:
+            csvfile.write('time\n1,2,3\n')
+        self.cache = QCMDDataCache(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        data = np.asfortranarray(np.arange(12.0).reshape(4, 3))
+        self.cache.save(data, self.cache.source_key())
+        loaded = self.cache.load(self.cache.source_key())
+        self.assertIsInstance(loaded, np.memmap)
+        self.assertFalse(loaded.flags.writeable)
+        self.assertTrue(np.array_equal(loaded, data))
+        self.assertTrue(loaded[:, 1].flags['C_CONTIGUOUS'])
+
+    def test_invalidated_by_change(self):
+        self.cache.save(np.zeros((2, 3)), self.cache.source_key())
+        with open(self.filename, 'a') as csvfile:
+            csvfile.write('4,5,6\n')
+        self.assertIsNone(self.cache.load(self.cache.source_key()))
+
+    def test_missing_cache(self):
+        self.assertIsNone(self.cache.load(self.cache.source_key()))
@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+
+from QCMDDataset import QCMDDataset
+
+
+class TestQCMDDataset(unittest.TestCase):
+
+    def setUp(self):
+        self.block = np.asfortranarray(np.random.RandomState(2).rand(1000, 13))
+        self.block[:, 0] = np.linspace(0, 10, 1000)
+        self.dataset = QCMDDataset(self.block[:, 0], [self.block[:, col] for col in range(1, 7)],
+                                   [self.block[:, col] for col in range(7, 13)])
+
+    def test_shared_views(self):
+        self.assertTrue(np.shares_memory(self.dataset.get_time(), self.block))
+        self.assertTrue(np.shares_memory(self.dataset.get_harmonics('dissipation')[5], self.block))
+        time, harmonics = self.dataset.window_data('frequency', 10, 20)
+        self.assertTrue(np.shares_memory(harmonics[0], self.block))
+
+    def test_lazy_structures(self):
+        self.assertIsNone(self.dataset.time_index)
+        self.assertEqual(self.dataset.window(1.0, 2.0), (100, 200))
+        self.assertIs(self.dataset.get_time_index(), self.dataset.time_index)
+        self.assertNotIn('frequency', self.dataset.pyramids)
+        self.assertIs(self.dataset.get_pyramids('frequency'), self.dataset.get_pyramids('frequency'))
+
+    def test_extend(self):
+        self.dataset.get_pyramids('frequency')
+        self.dataset.window(1.0, 2.0)
+        block = np.vstack((self.block, self.block[-10:] + np.array([10.0] + [0.0] * 12)))
+        self.dataset.extend(block[:, 0], [block[:, col] for col in range(1, 7)],
+                            [block[:, col] for col in range(7, 13)])
+        self.assertEqual(self.dataset.get_time_index().nearest(20.0), 1009)
+        self.assertEqual(self.dataset.get_pyramids('frequency')[0].count, 1010)
+
+    def test_matching_window(self):
+        other = QCMDDataset(self.block[:, 0].copy(), [self.block[:, col] for col in range(1, 7)],
+                            [self.block[:, col] for col in range(7, 13)])
+        self.assertEqual(other.matching_window(self.dataset, 100, 200), (100, 200))
+        self.assertEqual(other.matching_window(self.dataset, 900, 1000), (900, 1000))
+        shorter = QCMDDataset(self.block[:800, 0] + 0.004, [self.block[:800, col] for col in range(1, 7)],
+                              [self.block[:800, col] for col in range(7, 13)])
+        self.assertEqual(shorter.matching_window(self.dataset, 100, 200), (100, 200))
+        self.assertEqual(shorter.matching_window(self.dataset, 700, 1000), (700, 800))
@@ -0,0 +1,39 @@
+import unittest
+
+import numpy as np
+
+from QCMDDecimation import DecimationPyramid
+
+
+class TestDecimationPyramid(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        self.x = np.linspace(0, 10, 100001)
+        self.y = np.sin(self.x) + 0.01 * np.cos(977 * self.x)
+        self.pyramid = DecimationPyramid(self.x, self.y)
+
+    def test_points_scale_with_pixels(self):
+        x, y = self.pyramid.get_view(0, 10, 500)
+        self.assertLessEqual(len(x), 2 * 500 + 2)
+        self.assertGreater(len(x), 500)
+
+    def test_envelope_kept(self):
+        x, y = self.pyramid.get_view(0, 10, 300)
+        self.assertEqual(y.max(), self.y.max())
+        self.assertEqual(y.min(), self.y.min())
+        self.assertEqual((x[0], x[-1]), (self.x[0], self.x[-1]))
+        self.assertTrue(np.all(np.diff(x) >= 0))
+
+    def test_extend_matches_full_build(self):
+        pyramid = DecimationPyramid(self.x[:1001], self.y[:1001])
+        for end in (1002, 5003, 5004, 77777, len(self.x)):
+            pyramid.extend(self.x[:end], self.y[:end])
+        self.assertEqual(len(pyramid.levels), len(self.pyramid.levels))
+        for (imin, imax), (full_min, full_max) in zip(pyramid.levels, self.pyramid.levels):
+            self.assertTrue(np.array_equal(imin.view(), full_min.view()))
+            self.assertTrue(np.array_equal(imax.view(), full_max.view()))
+
+    def test_zoomed_view_is_raw(self):
+        x, y = self.pyramid.get_view(5, 5.001, 400)
+        self.assertTrue(np.array_equal(y, self.y[(self.x >= x[0]) & (self.x <= x[-1])]))
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from QCMDBenchmark import generate_sensor_file
+from QCMDDataset import QCMDDataset
+from QCMDDerived import DERIVED_CHANNELS, HARMONIC_NUMBERS, SAUERBREY_CONSTANT, TAB_CHANNELS
+from QCMDExcelReader import QCMDDataReader as QCMDSensorReader
+from QCMDFitting import fit_checked, rolling_fit
+from QCMDSegmentation import linear_regions
+
+
+class TestDerivedChannels(unittest.TestCase):
+
+    def setUp(self):
+        self.block = np.asfortranarray(np.random.RandomState(8).rand(1000, 13))
+        self.block[:, 0] = np.linspace(0, 10, 1000)
+        self.block[0, 1:7] = 0.0
+        self.dataset = self.make_dataset(self.block)
+
+    def make_dataset(self, block):
+        return QCMDDataset(block[:, 0], [block[:, col] for col in range(1, 7)],
+                           [block[:, col] for col in range(7, 13)])
+
+    def test_values(self):
+        normalised = self.dataset.get_harmonics('normalised')
+        mass = self.dataset.get_harmonics('mass')
+        ratio = self.dataset.get_harmonics('ratio')
+        for column, number in enumerate(HARMONIC_NUMBERS):
+            frequency = self.block[:, column + 1]
+            self.assertTrue(np.allclose(normalised[column], frequency / number))
+            self.assertTrue(np.allclose(mass[column], -SAUERBREY_CONSTANT * frequency / number))
+            self.assertTrue(np.allclose(ratio[column][1:], self.block[1:, column + 7] / frequency[1:]))
+            self.assertTrue(np.isnan(ratio[column][0]))
+
+    def test_lazy_and_cached(self):
+        self.assertEqual(self.dataset.derived, dict())
+        first = self.dataset.get_harmonics('mass')
+        self.assertIs(self.dataset.get_harmonics('mass'), first)
+        self.assertEqual(list(self.dataset.derived), ['mass'])
+        time, window = self.dataset.window_data('mass', 10, 20)
+        self.assertTrue(np.shares_memory(window[2], first[2]))
+
+    def test_dropped_when_run_grows(self):
+        self.dataset.get_pyramids('normalised')
+        first = self.dataset.get_harmonics('normalised')
+        block = np.vstack((self.block, self.block[-10:] + np.array([10.0] + [0.0] * 12)))
+        self.dataset.extend(block[:, 0], [block[:, col] for col in range(1, 7)],
+                            [block[:, col] for col in range(7, 13)])
+        self.assertIsNot(self.dataset.get_harmonics('normalised'), first)
+        self.assertEqual(len(self.dataset.get_harmonics('normalised')[0]), 1010)
+        self.assertEqual(self.dataset.get_pyramids('normalised')[0].count, 1010)
+
+    def test_every_derived_channel_on_a_tab(self):
+        tab_channels = [channel for channels in TAB_CHANNELS.values() for channel in channels]
+        self.assertEqual(sorted(set(tab_channels) - set(['frequency', 'dissipation'])), sorted(DERIVED_CHANNELS))
+        self.assertRaises(KeyError, self.dataset.get_harmonics, 'viscosity')
+
+
+class TestRatioOfSensorExport(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fits_and_regions(self):
+        filename = os.path.join(self.directory, 'sensors.txt')
+        generate_sensor_file(filename, 20000, 1)
+        #The first sample baseline makes every shift zero at sample 0
+        dataset = QCMDDataset.from_reader(QCMDSensorReader(filename, '\t'))
+        ratio = dataset.get_harmonics('ratio')
+        self.assertTrue(np.isnan(ratio[0][0]))
+        names, fits = fit_checked(dataset.time[:1000], [column[:1000] for column in ratio], ['F3', 'F5'])
+        self.assertFalse(np.isnan(fits).any())
+        block = np.column_stack(ratio[:2])
+        starts, rolling = rolling_fit(dataset.time, block, 500, 100)
+        self.assertFalse(np.isnan(rolling).any())
+        regions = linear_regions(dataset.time[1:], block[1:])
+        self.assertNotEqual(regions, [])
+        self.assertEqual(linear_regions(dataset.time, block), [(start + 1, end + 1) for start, end in regions])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import csv
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from QCMDDataset import QCMDDataset
+from QCMDExcelReader import SENSOR_COLUMNS, SENSOR_INDEX, QCMDChunkReader, QCMDDataReader, is_sensor_export
+
+
+class TestQCMDDataReader(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        filename = 'E:\Chrome Download\Mannose 24-1-17.txt'
+        self.reader = QCMDDataReader(filename, '\t')
+
+    def test_num_sensors(self):
+        self.assertEqual(self.reader.num_sensors, 2)
+
+    def test_qcmd_data_list_size(self):
+        self.assertEqual(len(self.reader.qcmd_data_list),2)
+
+    #def test_get_time(self):
+     #   self.assertEqual(self.reader.get_time()[0], 0.34)
+
+
+class TestQCMDChunkReader(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(handle, 'w', newline='') as txtfile:
+            writer = csv.writer(txtfile, delimiter='\t')
+            writer.writerow(['Time'] + ['Value'] * (2 * SENSOR_COLUMNS - 1))
+            for row in range(25):
+                writer.writerow([row + offset for offset in range(2 * SENSOR_COLUMNS)])
+
+    @classmethod
+    def tearDownClass(self):
+        os.remove(self.filename)
+
+    def test_chunk_sizes(self):
+        reader = QCMDChunkReader(self.filename, '\t', chunk_size=10)
+        chunks = list(reader)
+        self.assertEqual(reader.num_sensors, 2)
+        self.assertEqual([len(chunk[0]) for chunk in chunks], [9, 10, 6])
+        self.assertEqual(chunks[0][1].shape, (9, SENSOR_COLUMNS))
+
+    def test_baseline_zeroed(self):
+        chunks = list(QCMDChunkReader(self.filename, '\t', chunk_size=10))
+        sensor = np.concatenate([chunk[1] for chunk in chunks])
+        self.assertEqual(list(sensor[:, 0]), [float(row + SENSOR_COLUMNS) for row in range(25)])
+        self.assertTrue(np.array_equal(sensor[:, 1:], np.repeat(np.arange(25.0)[:, None], SENSOR_COLUMNS - 1, axis=1)))
+
+
+class TestQCMDSensorData(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(handle, 'w', newline='') as txtfile:
+            writer = csv.writer(txtfile, delimiter='\t')
+            writer.writerow(['Time'] + ['Value'] * (2 * SENSOR_COLUMNS - 1))
+            for row in range(25):
+                writer.writerow([row * (offset + 1) for offset in range(2 * SENSOR_COLUMNS)])
+        self.reader = QCMDDataReader(self.filename, '\t', chunk_size=10)
+
+    @classmethod
+    def tearDownClass(self):
+        os.remove(self.filename)
+
+    def test_sensors(self):
+        self.assertEqual(self.reader.num_sensors, 2)
+        self.assertEqual([len(sensor) for sensor in self.reader.get_sensor_data()], [25, 25])
+
+    def test_schema_columns(self):
+        sensor = self.reader.get_sensor_data()[1]
+        self.assertEqual(sensor.f11[3], 3.0 * (SENSOR_COLUMNS + SENSOR_INDEX['f11'] + 1))
+        self.assertEqual(sensor.time[3], 3.0 * (SENSOR_COLUMNS + 1))
+        self.assertEqual(len(sensor.get_values()), SENSOR_COLUMNS)
+        self.assertTrue(np.shares_memory(sensor.d13, sensor.data))
+
+    def test_normalised(self):
+        sensor = self.reader.get_sensor_data()[0]
+        self.assertEqual(list(sensor.data[0, 1:]), [0.0] * (SENSOR_COLUMNS - 1))
+        self.assertNotEqual(sensor.time[0], sensor.time[1])
+
+    def test_compact(self):
+        sensor = self.reader.get_sensor_data()[0]
+        with self.assertRaises(AttributeError):
+            sensor.extra = 1
+        self.assertEqual(sensor.data.nbytes, 25 * SENSOR_COLUMNS * 8)
+
+    def test_detected_as_sensor_export(self):
+        self.assertTrue(is_sensor_export(self.filename))
+        self.assertFalse(is_sensor_export('Book4.csv'))
+
+    def test_dataset_of_every_sensor(self):
+        dataset = QCMDDataset.from_reader(self.reader)
+        self.assertEqual([sensor.label for sensor in dataset.sensors], ['S1', 'S2'])
+        second = dataset.sensors[1]
+        self.assertIs(second.sensors, dataset.sensors)
+        self.assertTrue(np.array_equal(second.get_harmonics('dissipation')[5], self.reader.get_sensor_data()[1].d13))
+        self.assertEqual(second.window(3.0 * (SENSOR_COLUMNS + 1), 10.0 * (SENSOR_COLUMNS + 1)), (3, 10))
+
+    def test_peak_memory(self):
+        #Sensors are filled as chunks arrive, so reading never holds the data twice
+        handle, filename = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(handle, 'w', newline='') as txtfile:
+            writer = csv.writer(txtfile, delimiter='\t')
+            writer.writerow(['Time'] + ['Value'] * (2 * SENSOR_COLUMNS - 1))
+            for row in range(40000):
+                writer.writerow([row + offset for offset in range(2 * SENSOR_COLUMNS)])
+        try:
+            tracemalloc.start()
+            reader = QCMDDataReader(filename, '\t', chunk_size=1000)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        finally:
+            os.remove(filename)
+        size = sum(sensor.data.nbytes for sensor in reader.get_sensor_data())
+        self.assertEqual(size, 2 * 40000 * SENSOR_COLUMNS * 8)
+        self.assertLess(peak, 1.5 * size)
@@ -0,0 +1,63 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from QCMDExport import export_results, load_results
+from QCMDFitting import RESULT_HEADERS, result_records
+
+
+class TestQCMDExport(unittest.TestCase):
+
+    class Selection():
+        def __init__(self, id, xdata, harmonics):
+            self.id = id
+            self.xdata = xdata
+            self.harmonics = harmonics
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        fits = np.arange(12.0).reshape(2, 6) / 7
+        self.results = {'frequency': result_records(['F3', 'F5'], fits, 1),
+                        'dissipation': result_records(['F3'], fits[:1], 2)}
+        time = np.linspace(0, 1, 5)
+        self.selections = {'frequency': [self.Selection(1, time, [time * n for n in range(6)])]}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_csv_layout(self):
+        filename = os.path.join(self.directory, 'fits.csv')
+        export_results(filename, self.results, self.selections)
+        with open(filename, newline='') as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual(rows[0], RESULT_HEADERS)
+        self.assertEqual(rows[1], ['F3 1', '0.0', '0.143', '0.286', '0.429', '0.571', '0.714', '', '', '', ''])
+        self.assertEqual(rows[3], [])
+        self.assertEqual(rows[4], RESULT_HEADERS)
+        self.assertEqual(rows[5][0], 'F3 2')
+
+        with open(os.path.join(self.directory, 'fits_selections.csv'), newline='') as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[5], ['frequency', '1', '1.0', '0.0', '1.0', '2.0', '3.0', '4.0', '5.0'])
+
+    def test_csv_intervals(self):
+        fits = np.arange(6.0)[np.newaxis]
+        results = {'frequency': result_records(['F3'], fits, 1, np.array([[-0.5, 0.5, 0.75, 1.25]]))}
+        filename = os.path.join(self.directory, 'intervals.csv')
+        export_results(filename, results)
+        with open(filename, newline='') as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual(rows[1][7:], ['-0.5', '0.5', '0.75', '1.25'])
+
+    def test_npz_round_trip(self):
+        filename = os.path.join(self.directory, 'fits.npz')
+        export_results(filename, self.results, self.selections)
+        arrays = load_results(filename)
+        self.assertEqual(arrays['frequency_results'].tobytes(), self.results['frequency'].tobytes())
+        self.assertEqual(arrays['frequency_selection_1_harmonics'].shape, (5, 6))
+        self.assertEqual(len(arrays['dissipation_results']), 1)
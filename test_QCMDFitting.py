@@ -0,0 +1,132 @@
+import unittest
+
+import numpy as np
+from scipy import stats
+
+from QCMDAnalyser import QCMDDataReader
+from QCMDFitting import ID_LENGTH, FitResultCache, fit_checked, fit_lines, result_records, rolling_fit
+
+
+class TestFitLines(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        random = np.random.RandomState(3)
+        self.x = np.linspace(0, 20, 5000)
+        self.harmonics = np.column_stack([slope * self.x + random.standard_t(3, len(self.x))
+                                          for slope in (0.1, -2.0, 0.0, 5.0)])
+        self.fits = fit_lines(self.x, self.harmonics)
+
+    def test_matches_linregress(self):
+        for column, fit in enumerate(self.fits):
+            expected = stats.linregress(self.x, self.harmonics[:, column])
+            self.assertTrue(np.allclose(fit[:4], expected[:4], rtol=1e-9, atol=1e-12))
+
+    def test_matches_normaltest(self):
+        for column, fit in enumerate(self.fits):
+            slope, intercept = stats.linregress(self.x, self.harmonics[:, column])[:2]
+            expected = stats.normaltest(self.harmonics[:, column] - (slope * self.x + intercept))
+            self.assertTrue(np.allclose(fit[4:], expected, rtol=1e-6, atol=1e-12))
+
+    def test_cache_refits_misses_only(self):
+        cache = FitResultCache(maxsize=3)
+        harmonics = [self.harmonics[:, column] for column in range(4)]
+        names, fits = cache.fit_window(1, 0, 5000, 'frequency', self.x, harmonics, ['F3', False, 'F7', False])
+        self.assertEqual(names, ['F3', 'F7'])
+        self.assertTrue(np.allclose(fits, self.fits[[0, 2]]))
+        self.assertEqual(len(cache), 2)
+
+        names, fits = cache.fit_window(1, 0, 5000, 'frequency', self.x, harmonics, ['F3', 'F5', 'F7', 'F9'])
+        self.assertTrue(np.allclose(fits, self.fits))
+        self.assertEqual(len(cache), 3)
+        self.assertNotIn((1, 0, 5000, 'F3', 'frequency'), cache.results)
+
+        cache.discard_window(1, 0, 5000)
+        self.assertEqual(len(cache), 0)
+
+    def test_cache_other_fit(self):
+        cache = FitResultCache()
+        harmonics = [self.harmonics[:, column] for column in range(4)]
+        calls = list()
+
+        def spread(x, columns):
+            calls.append(columns.shape[1])
+            return np.column_stack((columns.min(axis=0), columns.max(axis=0)))
+        cache.fit_window(1, 0, 5000, 'frequency', self.x, harmonics, ['F3', False, False, False])
+        names, values = cache.fit_window(1, 0, 5000, 'frequency', self.x, harmonics, ['F3', 'F5', False, False],
+                                         spread, 2, 'spread')
+        names, values = cache.fit_window(1, 0, 5000, 'frequency', self.x, harmonics, ['F3', 'F5', False, False],
+                                         spread, 2, 'spread')
+        self.assertEqual(calls, [2])
+        self.assertEqual(values.shape, (2, 2))
+        self.assertEqual(values[1, 1], self.harmonics[:, 1].max())
+        self.assertEqual(len(cache), 3)
+
+    def test_single_column(self):
+        self.assertEqual(fit_lines(self.x, self.harmonics[:, 0]).shape, (1, 6))
+
+    def test_fit_checked_skips_non_finite(self):
+        harmonics = [column.copy() for column in self.harmonics.T]
+        harmonics[1][:10] = np.nan
+        names, fits = fit_checked(self.x, harmonics, ['F3', 'F5', False, 'F9'])
+        self.assertTrue(np.allclose(fits[[0, 2]], self.fits[[0, 3]]))
+        self.assertTrue(np.allclose(fits[1], fit_lines(self.x[10:], harmonics[1][10:])[0]))
+
+    def test_long_ids_kept(self):
+        name = 'Mannose 24-1-17 overnight run 2.csv huber F13'
+        records = result_records([name], fit_lines(self.x, self.harmonics[:, :1]), 12)
+        self.assertEqual(records['id'][0], name + ' 12')
+        self.assertRaises(ValueError, result_records, ['F3' * ID_LENGTH], np.zeros((1, 6)), 1)
+
+
+class TestRollingFit(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        random = np.random.RandomState(4)
+        self.x = np.linspace(-0.6, 40, 20000)
+        self.harmonics = np.column_stack([30 * np.exp(-self.x / 5) + random.standard_normal(len(self.x)) * 0.05,
+                                          500 - 2 * self.x + random.standard_t(4, len(self.x)) * 0.1])
+
+    def test_matches_fit_lines(self):
+        starts, fits = rolling_fit(self.x, self.harmonics, 400, 37, segment=50)
+        self.assertEqual(list(starts[:3]), [0, 37, 74])
+        self.assertLessEqual(starts[-1] + 400, len(self.x))
+        self.assertEqual(fits.shape, (len(starts), 2, 6))
+        for window in (0, 61, len(starts) - 1):
+            start = starts[window]
+            expected = fit_lines(self.x[start:start + 400], self.harmonics[start:start + 400])
+            self.assertTrue(np.allclose(fits[window], expected, rtol=1e-6, atol=1e-9))
+
+    def test_single_harmonic_every_sample(self):
+        starts, fits = rolling_fit(self.x[:500], self.harmonics[:500, 1], 20)
+        self.assertEqual(len(starts), 481)
+        expected = fit_lines(self.x[250:270], self.harmonics[250:270, 1])
+        self.assertTrue(np.allclose(fits[250], expected, rtol=1e-6, atol=1e-9))
+
+    def test_non_finite_samples_left_out(self):
+        harmonics = self.harmonics[:2000].copy()
+        harmonics[0] = np.nan
+        harmonics[1000:1010, 1] = np.inf
+        starts, fits = rolling_fit(self.x[:2000], harmonics, 400, 50)
+        self.assertFalse(np.isnan(fits).any())
+        self.assertTrue(np.allclose(fits[0], fit_lines(self.x[1:400], harmonics[1:400]), rtol=1e-6, atol=1e-9))
+        finite = np.isfinite(harmonics[800:1200, 1])
+        expected = fit_lines(self.x[800:1200][finite], harmonics[800:1200, 1][finite])
+        self.assertTrue(np.allclose(fits[16, 1], expected, rtol=1e-6, atol=1e-9))
+
+    def test_k2_on_real_run(self):
+        reader = QCMDDataReader('Book4.csv', use_cache=False)
+        x = np.asarray(reader.get_time(), dtype=np.float64)
+        harmonics = np.column_stack(reader.get_harmonics() + reader.get_dissapation())
+        for stride in (1, 100):
+            starts, fits = rolling_fit(x, harmonics, 5000, stride)
+            for window in range(0, len(starts), max(1, len(starts) // 100)):
+                start = starts[window]
+                expected = fit_lines(x[start:start + 5000], harmonics[start:start + 5000])
+                self.assertTrue(np.allclose(fits[window, :, :4], expected[:, :4], rtol=1e-6, atol=1e-9))
+                self.assertTrue(np.allclose(fits[window, :, 4], expected[:, 4], rtol=0, atol=0.05))
+
+    def test_bad_width(self):
+        self.assertRaises(ValueError, rolling_fit, self.x[:10], self.harmonics[:10], 11)
+        self.assertRaises(ValueError, rolling_fit, self.x, self.harmonics, 2)
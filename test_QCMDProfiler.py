@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+import unittest
+
+from QCMDProfiler import profiler, timed
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.enabled = profiler.enabled
+        profiler.reset()
+
+    def tearDown(self):
+        profiler.enable(self.enabled)
+        profiler.reset()
+
+    def test_disabled_records_nothing(self):
+        profiler.enable(False)
+        timed('stage')(lambda: None)()
+        with profiler.stage('block'):
+            pass
+        self.assertEqual(profiler.summary(), dict())
+
+    def test_counts_and_trace(self):
+        profiler.enable()
+        square = timed('square')(lambda value: value * value)
+        self.assertEqual(square(3), 9)
+        square(4)
+        with profiler.stage('block'):
+            pass
+        summary = profiler.summary()
+        self.assertEqual(summary['square']['count'], 2)
+        self.assertEqual(summary['block']['count'], 1)
+        self.assertGreaterEqual(summary['square']['max_ms'], summary['square']['last_ms'])
+        events = profiler.trace_events()
+        self.assertEqual([event['name'] for event in events], ['square', 'square', 'block'])
+        self.assertTrue(all(event['ph'] == 'X' and event['dur'] >= 0 for event in events))
+
+    def test_exception_still_recorded(self):
+        profiler.enable()
+
+        @timed('failing')
+        def failing():
+            raise ValueError()
+        self.assertRaises(ValueError, failing)
+        self.assertEqual(profiler.summary()['failing']['count'], 1)
+
+    def test_dump(self):
+        profiler.enable()
+        timed('stage')(lambda: None)()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'trace.json')
+            profiler.dump(filename)
+            with open(filename) as tracefile:
+                trace = json.load(tracefile)
+        self.assertEqual(trace['traceEvents'][0]['name'], 'stage')
+        self.assertEqual(trace['otherData']['summary']['stage']['count'], 1)
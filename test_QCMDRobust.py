@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+from scipy import stats
+
+from QCMDFitting import fit_lines
+from QCMDRobust import FIT_ENGINES, fit_huber, fit_theil_sen, fit_weighted, local_variance
+
+
+class TestFitEngines(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(11)
+        self.x = np.linspace(0, 10, 2000)
+        self.slopes = np.array([2.0, -0.5, 0.0])
+        self.harmonics = self.x[:, np.newaxis] * self.slopes + np.array([1.0, 5.0, -3.0])
+        self.harmonics += random.standard_normal(self.harmonics.shape) * 0.1
+
+    def test_layout(self):
+        expected = fit_lines(self.x, self.harmonics)
+        for engine, (label, fit) in FIT_ENGINES.items():
+            result = fit(self.x, self.harmonics)
+            self.assertEqual(result.shape, (3, 6))
+            self.assertTrue(np.allclose(result[:, :2], expected[:, :2], atol=0.02), engine)
+            self.assertTrue(np.allclose(result[:, 2], expected[:, 2], atol=0.01), engine)
+
+    def test_robust_to_outliers(self):
+        spoiled = self.harmonics.copy()
+        spoiled[::20] += 50.0
+        self.assertFalse(np.allclose(fit_lines(self.x, spoiled)[:, 1], [1.0, 5.0, -3.0], atol=0.5))
+        for fit in (fit_huber, fit_theil_sen):
+            result = fit(self.x, spoiled)
+            self.assertTrue(np.allclose(result[:, 0], self.slopes, atol=0.01))
+            self.assertTrue(np.allclose(result[:, 1], [1.0, 5.0, -3.0], atol=0.1))
+
+    def test_theil_sen_matches_scipy(self):
+        x, column = self.x[:300], self.harmonics[:300, 0]
+        expected = stats.theilslopes(column, x, method='joint')
+        result = fit_theil_sen(x, column)
+        self.assertAlmostEqual(result[0, 0], expected[0])
+        self.assertAlmostEqual(result[0, 1], expected[1])
+
+    def test_theil_sen_sampled_is_seeded(self):
+        first = fit_theil_sen(self.x, self.harmonics, pairs=5000)
+        self.assertTrue(np.array_equal(first, fit_theil_sen(self.x, self.harmonics, pairs=5000)))
+        self.assertTrue(np.allclose(first[:, 0], self.slopes, atol=0.02))
+
+    def test_weighted(self):
+        equal = fit_weighted(self.x, self.harmonics, np.ones(len(self.x)))
+        self.assertTrue(np.allclose(equal[:, :4], fit_lines(self.x, self.harmonics)[:, :4]))
+        #A noisy second half counts for little once its variance is known
+        noisy = self.harmonics.copy()
+        noisy[1000:] += np.random.RandomState(3).standard_normal((1000, 3)) * 5.0
+        variances = local_variance(noisy, 50)
+        self.assertTrue(np.all(variances[1100:1900].mean(axis=0) > 100 * variances[100:900].mean(axis=0)))
+        weighted = fit_weighted(self.x, noisy)
+        self.assertTrue(np.allclose(weighted[:, 0], self.slopes, atol=0.02))
+
+
+if __name__ == '__main__':
+    unittest.main()
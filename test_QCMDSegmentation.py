@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+from QCMDSegmentation import SegmentCost, linear_regions, noise_level, segment_lines
+
+
+class TestSegmentLines(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        random = np.random.RandomState(5)
+        self.x = np.linspace(0, 60, 30000)
+        self.knots = [0, 10, 18, 30, 42, 60]
+        slopes = [0.5, -3.0, 0.0, 1.2, -0.4]
+        base = np.interp(self.x, self.knots, np.concatenate(([20], 20 + np.cumsum(np.multiply(slopes, np.diff(self.knots))))))
+        self.harmonics = np.column_stack([base * (number + 1) + random.standard_normal(len(self.x)) * 0.1
+                                          for number in range(4)])
+
+    def test_cost_matches_line_fit(self):
+        cost = SegmentCost(self.x, self.harmonics[:, :2])
+        sigma = noise_level(self.harmonics[:, :2])
+        start, end = 2000, 2500
+        expected = 0.0
+        for column in range(2):
+            line = np.polyfit(self.x[start:end], self.harmonics[start:end, column], 1)
+            residuals = self.harmonics[start:end, column] - np.polyval(line, self.x[start:end])
+            expected += np.sum(residuals ** 2) / sigma[column] ** 2
+        self.assertAlmostEqual(float(cost(start, end)), expected, delta=expected * 1e-6)
+        self.assertTrue(np.allclose(cost(np.array([start, 0]), end), [cost(start, end), cost(0, end)]))
+        self.assertTrue(0.05 < sigma[0] < 0.2)
+
+    def test_finds_breakpoints(self):
+        breakpoints = segment_lines(self.x, self.harmonics)
+        self.assertEqual(breakpoints[0], 0)
+        self.assertEqual(breakpoints[-1], len(self.x))
+        found = self.x[breakpoints[1:-1]]
+        self.assertEqual(len(found), 4)
+        self.assertTrue(np.allclose(found, self.knots[1:-1], atol=0.05))
+
+    def test_straight_run_is_one_region(self):
+        regions = linear_regions(self.x[:4000], self.harmonics[:4000])
+        self.assertEqual(regions, [(0, 4000)])
+
+    def test_non_finite_samples_left_out(self):
+        harmonics = self.harmonics[:4000].copy()
+        harmonics[0] = np.nan
+        harmonics[2000, 1] = np.inf
+        self.assertEqual(linear_regions(self.x[:4000], harmonics), [(1, 4000)])
+
+    def test_curve_is_not_proposed_whole(self):
+        curve = 30 * np.exp(-self.x / 5) + np.random.RandomState(6).standard_normal(len(self.x)) * 0.05
+        regions = linear_regions(self.x, curve)
+        self.assertNotIn((0, len(self.x)), regions)
+        for start, end in regions:
+            self.assertLess(start, end)
+
+
+if __name__ == '__main__':
+    unittest.main()
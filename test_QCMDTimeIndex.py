@@ -0,0 +1,34 @@
+import unittest
+
+import numpy as np
+
+from QCMDTimeIndex import TimeIndex
+
+
+class TestTimeIndex(unittest.TestCase):
+
+    def test_matches_argmin(self):
+        time = np.cumsum(np.random.RandomState(1).rand(1000))
+        index = TimeIndex(time)
+        for value in np.linspace(-5, time[-1] + 5, 301):
+            self.assertEqual(index.nearest(value), np.argmin((time - value) ** 2))
+
+    def test_not_monotonic(self):
+        time = np.array([3.0, 1.0, 2.0, 5.0, 4.0])
+        index = TimeIndex(time)
+        self.assertFalse(index.monotonic)
+        self.assertEqual(index.nearest(4.9), 3)
+        self.assertEqual(list(index.nearest_many([0.0, 2.2, 10.0])), [1, 2, 3])
+
+    def test_extend(self):
+        index = TimeIndex([1.0, 2.0])
+        index.extend([1.0, 2.0, 3.0])
+        self.assertTrue(index.monotonic)
+        self.assertEqual(index.nearest(2.9), 2)
+        index.extend([1.0, 2.0, 3.0, 0.0])
+        self.assertFalse(index.monotonic)
+        self.assertEqual(index.nearest(-1.0), 3)
+
+    def test_missing_value(self):
+        with self.assertRaises(TypeError):
+            TimeIndex([1.0, 2.0]).nearest(None)